@@ -9,6 +9,9 @@ import sys
 import argparse
 import logging
 import re
+import pickle
+import tempfile
+import numpy as np
 import pandas as pd
 
 #########################
@@ -39,6 +42,47 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', date
 script_name = os.path.splitext( os.path.basename(__file__) )[0].upper()
 
 
+###################
+# Local functions #
+###################
+def read_chunks(ifile, out_cols):
+    '''
+    Read the file by chunks (values as text) with the columns of the output.
+    The missing columns are empty text values, so they have the same digests as the empty values of the other file
+    '''
+    for chunk in common.read_table(ifile, 1, typed=False):
+        yield chunk.reindex(columns=out_cols).astype({ c: object for c in out_cols if c not in chunk.columns })
+
+def get_digests(chunk, cols):
+    '''
+    64-bit digests of the given columns (or the whole row) of the chunk
+    '''
+    return pd.util.hash_pandas_object(chunk[cols] if len(cols) > 0 else chunk, index=False).to_numpy()
+
+def count_digests(digests):
+    '''
+    Compact set of digests with their counts (sorted arrays)
+    '''
+    digests = np.concatenate(digests) if digests else np.array([], dtype=np.uint64)
+    return np.unique(digests, return_counts=True)
+
+def get_counts(digests, keys, counts):
+    '''
+    Number of occurrences of the digests in the compact set
+    '''
+    if len(keys) == 0:
+        return np.zeros(len(digests), dtype=np.int64)
+    idx = np.minimum(np.searchsorted(keys, digests), len(keys)-1)
+    return np.where(keys[idx] == digests, counts[idx], 0)
+
+def write_chunk(f, chunk, label, header):
+    '''
+    Append the rows to the output file with the label of the file
+    '''
+    chunk = chunk.assign(file_label=label)
+    chunk.to_csv(f, sep="\t", index=False, header=header)
+
+
 #################
 # Main function #
 #################
@@ -51,31 +95,54 @@ def main(args):
     [ print(f"{k} = {v}") for k,v in conf_args.items() ]
     ifile1 = conf_args['infile1']
     ifile2 = conf_args['infile2']
-    cols = re.split('\s*,\s*', conf_args['cols']) if args.c and args.c != '' else []
+    cols = re.split(r'\s*,\s*', conf_args['cols']) if conf_args.get('cols', '') != '' else []
     ofile = conf_args['outfile']
     
-    logging.info("reading input files...")
-    data1 = pd.read_csv(ifile1, sep="\t", low_memory=False)
-    data2 = pd.read_csv(ifile2, sep="\t", low_memory=False)
-
-    logging.info("generating a prefix in the index for file identification purposes...")
-    data1.rename('{}_1'.format, inplace=True)
-    data2.rename('{}_2'.format, inplace=True)
-
+    # the output has the columns of both files
+    _, header1 = common.read_header(ifile1, 1)
+    _, header2 = common.read_header(ifile2, 1)
+    out_cols = header1 + [ c for c in header2 if c not in header1 ]
     if len(cols) > 0:
         logging.info(f"getting the differences based on the given columns: {cols} ...")
-        # take into account the given columns
-        diff = pd.concat([data1,data2]).drop_duplicates(subset=cols, keep=False)
     else:
         logging.info("getting the differences based on all columns...")
-        # take into account all columns
-        diff = pd.concat([data1,data2]).drop_duplicates(keep=False)
 
-    logging.info("adding a column for file identification purposes...")
-    diff['file_label'] = [ 'file1' if i.endswith('_1') else 'file2' for i in diff.index]
+    # a row is different if its key occurs once within both files
+    logging.info("hashing the keys of the first file...")
+    keys1, counts1 = count_digests([ get_digests(chunk, cols) for chunk in read_chunks(ifile1, out_cols) ])
+
+    with tempfile.TemporaryFile() as tmp:
+        logging.info("streaming the second file against the first one...")
+        digests2 = []
+        for chunk in read_chunks(ifile2, out_cols):
+            digests = get_digests(chunk, cols)
+            digests2.append(digests)
+            # keep the rows whose key is not in the first file (candidates to be different)
+            sel = get_counts(digests, keys1, counts1) == 0
+            if sel.any():
+                pickle.dump((chunk[sel], digests[sel]), tmp, protocol=pickle.HIGHEST_PROTOCOL)
+        keys2, counts2 = count_digests(digests2)
+        del digests2
 
-    logging.info("printing the output file...")
-    diff.to_csv(ofile, sep="\t", index=False)
+        logging.info("printing the output file...")
+        with open(ofile, 'w', newline='') as f:
+            header = True
+            for chunk in read_chunks(ifile1, out_cols):
+                digests = get_digests(chunk, cols)
+                sel = (get_counts(digests, keys1, counts1) == 1) & (get_counts(digests, keys2, counts2) == 0)
+                write_chunk(f, chunk[sel], 'file1', header)
+                header = False
+            tmp.seek(0)
+            while True:
+                try:
+                    chunk, digests = pickle.load(tmp)
+                except EOFError:
+                    break
+                write_chunk(f, chunk[get_counts(digests, keys2, counts2) == 1], 'file2', header)
+                header = False
+            # empty files
+            if header:
+                write_chunk(f, pd.DataFrame(columns=out_cols), 'file1', header)
 
 
 if __name__ == "__main__":
@@ -10,13 +10,13 @@ import argparse
 import logging
 import re
 import pandas as pd
-import numpy as np
 
 #########################
 # Import local packages #
 #########################
 sys.path.append(f"{os.path.dirname(__file__)}/../libs")
 import common
+import table_filter
 
 ###################
 # Parse arguments #
@@ -43,64 +43,33 @@ script_name = os.path.splitext( os.path.basename(__file__) )[0].upper()
 # Local functions #
 ###################
 
-def filter_dataframe(df, flt):
+def get_filters(conf_args):
     '''
-    Filter the dataframe
+    Named filters of the config: 'filter'/'outfile' and the optional pairs 'filter_<name>'/'outfile_<name>'
 
-    Parameters
-    ----------
-    df : pandas dataframe
-    flt : str (boolean expression)
-        Example: ([FDR] < 0.05) & ([n] >= 10) & ([n] <= 100)
     Returns
     -------
-    Filtered dataframe.
-
+    List of tuples (name, compiled filter, output file).
     '''
-    # flag that controls whether the df was filtered or not.
-    ok = False
-    
-    # BEGIN: patch for the values that contains brackets
-    xx = re.findall(r"'(.*)'", flt)
-    rr = [ (x,x.replace('[','{').replace(']','}')) for x in xx ]
-    flt = [ flt.replace(x,y) for x,y in rr ][0]
-    # END: patch for the values that contains brackets
-    
-    # check if the given filters is applied into given dataframe
-    f_cols = re.findall(r'\[([^\]]*)\]',flt)
-    intcols = np.intersect1d(df.columns,f_cols).tolist() if f_cols else []
-    # the columns in the filters are within df
-    if intcols:    
-        # add the df variable
-        flt = flt.replace("[","['").replace("]","']")
-        flt = flt.replace('[','df[')
-        flt = f"df[{flt}]"
-        
-        # BEGIN: patch for the values that contains brackets
-        flt = flt.replace('{','[').replace('}',']')
-        # END: patch for the values that contains brackets
-
+    filters = []
+    for k,v in conf_args.items():
+        m = re.match(r'^filter(?:_(.+))?$', k)
+        if not m or v == '':
+            continue
+        name = m.group(1) if m.group(1) else ''
+        okey = f"outfile_{name}" if name else 'outfile'
+        if conf_args.get(okey, '') == '':
+            sms = f"The output file of the filter '{k}' is missing: {okey}"
+            logging.error(sms)
+            sys.exit(sms)
         try:
-            # evaluate condition
-            idx = pd.eval(flt)
-            # extract the dataframe from the index
-            if not idx.empty:
-                df_new = df.loc[idx.index.to_list(),:]
-                df_new = df_new.reset_index()
-                df_new.drop(columns=df_new.columns[0], axis=1, inplace=True)
-                ok = True
-            else:
-                # not filter
-                logging.warning("The filter has not been applied")
-                df_new = df
-        except Exception as exc:
-            # not filter
-            logging.warning(f"The filter has not been applied. There was a problem evaluating the condition: {flt}\n{exc}")
-            df_new = df
-    else:
-        df_new = df
-
-    return ok,df_new
+            flt = table_filter.compile_filter(v)
+        except ValueError as exc:
+            logging.error(str(exc))
+            sys.exit(str(exc))
+        filters.append((name, flt, conf_args[okey]))
+    return filters
+
 
 #################
 # Main function #
@@ -114,24 +83,39 @@ def main(args):
     conf_args = common.read_config(script_name, args.c)
     [ print(f"{k} = {v}") for k,v in conf_args.items() ]
     ifile = conf_args['infile']
-    ifilter = conf_args['filter']
     # ifilter = "([tags] == 'out')"
-    # ifilter = "([idsup] == 'AAFTECCQAAD\[160.01746\]K')" # Fixed with a PATCH...
-    ofile = conf_args['outfile']
+    # ifilter = "([idsup] == 'AAFTECCQAAD\[160.01746\]K')"
 
-
-    logging.info("reading input files...")
-    data = pd.read_csv(ifile, sep="\t", low_memory=False)
-
-    logging.info("filtering the input table...")
-    ok_flt,data_f = filter_dataframe(data, ifilter)
-    if not ok_flt:
+    logging.info("compiling the filters...")
+    filters = get_filters(conf_args)
+    if not filters:
         sms = "The filter has not been applied"
         logging.error(sms)
         sys.exit(sms)
 
-    logging.info("printing the output file...")
-    data_f.to_csv(ofile, sep="\t", index=False)
+    # the columns in the filters are within the table
+    _, header = common.read_header(ifile, 1)
+    for _,flt,_ in filters:
+        miss = [ c for c in flt['columns'] if c not in header ]
+        if miss:
+            sms = f"The filter has not been applied. The columns {miss} are not in the table: {flt['filter']}"
+            logging.error(sms)
+            sys.exit(sms)
+
+    # the columns compared with other columns are compared as numbers if all the values of the file are numbers
+    numeric_cols = None
+    if [ c for _,flt,_ in filters for c in flt['pair_columns'] ]:
+        numeric_cols = { c: t != 'str' for c,t in common.infer_dtypes(ifile, 1).items() }
+
+    logging.info("filtering the input table...")
+    ofiles = [ open(ofile, 'w', newline='') for _,_,ofile in filters ]
+    try:
+        [ pd.DataFrame(columns=header).to_csv(f, sep="\t", index=False) for f in ofiles ]
+        for chunk in common.read_table(ifile, 1, typed=False):
+            for (_,flt,_),f in zip(filters, ofiles):
+                chunk[table_filter.apply_filter(flt, chunk, numeric_cols)].to_csv(f, sep="\t", index=False, header=False)
+    finally:
+        [ f.close() for f in ofiles ]
 
 
 if __name__ == "__main__":
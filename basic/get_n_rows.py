@@ -8,7 +8,9 @@ import os
 import sys
 import argparse
 import logging
-import pandas as pd
+import math
+import random
+import shutil
 
 #########################
 # Import local packages #
@@ -38,6 +40,98 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', date
 script_name = os.path.splitext( os.path.basename(__file__) )[0].upper()
 
 
+#############
+# Constants #
+#############
+# size of the blocks read backwards to find the last rows
+BLOCK_SIZE = 1 << 20
+# modes of selection of the rows
+MODES = ('head', 'tail', 'sample')
+
+
+###################
+# Local functions #
+###################
+def write_line(fo, line):
+    '''
+    Write the line making sure that it ends with a newline
+    '''
+    fo.write(line if line.endswith(b'\n') else line + b'\n')
+
+def copy_head(fi, fo, n_rows):
+    '''
+    Copy the first N lines (bytes, without parsing)
+    '''
+    for _ in range(n_rows):
+        line = fi.readline()
+        if not line:
+            break
+        write_line(fo, line)
+
+def copy_tail(fi, fo, n_rows):
+    '''
+    Copy the last N lines, seeking backwards from the end of the file (the header has already been read)
+    '''
+    start = fi.tell()
+    end = fi.seek(0, os.SEEK_END)
+    if n_rows <= 0 or end <= start:
+        return
+    # the last newline of the file does not start a new line
+    fi.seek(end-1)
+    last_nl = fi.read(1) == b'\n'
+    n_nl = n_rows + 1 if last_nl else n_rows
+    offset = start
+    pos = end
+    while pos > start:
+        size = min(BLOCK_SIZE, pos - start)
+        pos -= size
+        fi.seek(pos)
+        block = fi.read(size)
+        n = block.count(b'\n')
+        if n < n_nl:
+            n_nl -= n
+            continue
+        i = len(block)
+        for _ in range(n_nl):
+            i = block.rfind(b'\n', 0, i)
+        offset = pos + i + 1
+        break
+    fi.seek(offset)
+    shutil.copyfileobj(fi, fo, BLOCK_SIZE)
+    if not last_nl:
+        fo.write(b'\n')
+
+def copy_sample(fi, fo, n_rows, seed):
+    '''
+    Copy a uniform random sample of N lines in one streaming pass (reservoir sampling, algorithm L).
+    The sampled lines keep the order of the file. The memory is not constant: the N sampled lines are kept
+    in memory until the end of the file (but it does not depend on the size of the file).
+    '''
+    if n_rows <= 0:
+        return
+    rnd = random.Random(seed)
+    # uniform random number in (0, 1]
+    rand = lambda: 1.0 - rnd.random()
+    # the lines skipped until the next replacement of the reservoir
+    skip = lambda i, w: i + (math.floor(math.log(rand()) / math.log(1.0 - w)) if w < 1.0 else 0) + 1
+    reservoir = []
+    lines = enumerate(fi)
+    for i,line in lines:
+        reservoir.append((i, line))
+        if len(reservoir) == n_rows:
+            break
+    w = math.exp(math.log(rand()) / n_rows)
+    nxt = skip(n_rows-1, w)
+    for i,line in lines:
+        if i < nxt:
+            continue
+        reservoir[rnd.randrange(n_rows)] = (i, line)
+        w *= math.exp(math.log(rand()) / n_rows)
+        nxt = skip(i, w)
+    for _,line in sorted(reservoir):
+        write_line(fo, line)
+
+
 #################
 # Main function #
 #################
@@ -51,12 +145,26 @@ def main(args):
     ifile = conf_args['infile']
     n_rows = int(conf_args['n_rows'])
     ofile = conf_args['outfile']
-    
-    logging.info("reading input file...")
-    data = pd.read_csv(ifile, sep="\t", nrows=n_rows, low_memory=False)
+    mode = conf_args.get('mode', '') or 'head'
+    seed = int(conf_args['seed']) if conf_args.get('seed', '') != '' else None
+
+    # checking the parameters
+    if mode not in MODES:
+        sms = f"The mode '{mode}' is not valid {MODES}"
+        logging.error(sms)
+        sys.exit(sms)
 
-    logging.info("printing the output file...")
-    data.to_csv(ofile, sep="\t", index=False)
+    logging.info(f"copying the header and the {mode} rows...")
+    with open(ifile, 'rb') as fi, open(ofile, 'wb') as fo:
+        header = fi.readline()
+        if header:
+            write_line(fo, header)
+        if mode == 'head':
+            copy_head(fi, fo, n_rows)
+        elif mode == 'tail':
+            copy_tail(fi, fo, n_rows)
+        else:
+            copy_sample(fi, fo, n_rows, seed)
 
 
 if __name__ == "__main__":
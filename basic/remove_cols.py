@@ -9,7 +9,6 @@ import sys
 import argparse
 import logging
 import re
-import pandas as pd
 
 #########################
 # Import local packages #
@@ -50,28 +49,31 @@ def main(args):
     conf_args = common.read_config(script_name, args.c)
     [ print(f"{k} = {v}") for k,v in conf_args.items() ]
     ifile = conf_args['infile']
-    cols = re.split('\s*,\s*', conf_args['cols']) if args.c and args.c != '' else []
     ofile = conf_args['outfile']
+    nh = common.parse_n_headers(conf_args.get('n_headers', ''))
 
-    logging.info("reading input files...")
-    data = pd.read_csv(ifile, sep="\t", low_memory=False)
+    logging.info("reading the headers of the input file...")
+    nh, header = common.read_header(ifile, nh)
+    # if there are 2 headers, the columns are a list of tuples separated by semi-colon
+    if nh == 2:
+        cols = [ eval(c) for c in re.split(r'\s*;\s*', conf_args['cols']) ]
+    else:
+        cols = re.split(r'\s*,\s*', conf_args['cols']) if args.c and args.c != '' else []
 
-    logging.info(f"checking the given columns: {cols}")
+    logging.info(f"checking the given columns ({nh} headers): {cols}")
     # get the columns that do not exist in the table
-    cc = [c for c in cols if not c in data.columns]
+    cc = [c for c in cols if not c in header]
     if len(cc) > 0:
         sms = f"The specified columns do not exist in the provided table: {cc}"
         logging.error(sms)
         sys.exit(sms)
 
-    logging.info("removing the given columns...")
-    data = data.drop(columns=cols)
-    
-    logging.info("removing duplicates...")
-    data = data.drop_duplicates()
-    
-    logging.info("printing the output file...")
-    data.to_csv(ofile, sep="\t", index=False)
+    logging.info("removing the given columns and duplicates...")
+    # the removed columns are not parsed
+    seen = set()
+    with open(ofile, 'w', newline='') as f:
+        for i,chunk in enumerate(common.read_table(ifile, nh, usecols=[ c for c in header if c not in cols ], typed=False)):
+            common.drop_seen(chunk, seen).to_csv(f, sep="\t", index=False, header=(i == 0))
 
 
 if __name__ == "__main__":
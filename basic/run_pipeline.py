@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import os
+import sys
+import argparse
+import logging
+import re
+
+#########################
+# Import local packages #
+#########################
+sys.path.append(f"{os.path.dirname(__file__)}/../libs")
+import common
+import table_filter
+import external_sort
+
+###################
+# Parse arguments #
+###################
+
+parser = argparse.ArgumentParser(
+    description='Apply an ordered list of operations (filter, select, remove, dedup, sort) to the table in a single pass.',
+    epilog='''Usages:
+
+    python  run_pipeline.py  -c config.ini
+
+    Note: Please read the config file to determine which parameters should be used.
+    ''',
+    formatter_class=argparse.RawTextHelpFormatter)
+parser.add_argument('-c', required=True, help='Config input file in INI format')
+args = parser.parse_args()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%m/%d/%Y %I:%M:%S %p')
+
+# get the name of script
+script_name = os.path.splitext( os.path.basename(__file__) )[0].upper()
+
+
+#############
+# Constants #
+#############
+# operations of the steps
+OPERATIONS = ('filter', 'select', 'remove', 'dedup', 'sort')
+
+
+###################
+# Local functions #
+###################
+def exit_error(sms):
+    logging.error(sms)
+    sys.exit(sms)
+
+def parse_cols(value, nh):
+    '''
+    List of columns: separated by commas, or tuples separated by semi-colon with two headers
+    '''
+    value = value.strip()
+    if value == '':
+        return []
+    if nh == 2:
+        return [ eval(c) for c in re.split(r'\s*;\s*', value) ]
+    return re.split(r'\s*,\s*', value)
+
+def get_steps(conf_args, nh):
+    '''
+    Ordered steps of the config ('step<N> = <operation>: <arguments>')
+
+    Returns
+    -------
+    List of tuples (operation, compiled filter or list of columns).
+    '''
+    steps = []
+    for k,v in conf_args.items():
+        m = re.match(r'^step(\d+)$', k)
+        if m:
+            steps.append((int(m.group(1)), v))
+    out = []
+    for _,v in sorted(steps):
+        op, _, value = v.partition(':')
+        op = op.strip().lower()
+        if op not in OPERATIONS:
+            exit_error(f"The operation '{op}' is not valid {OPERATIONS}: {v}")
+        if op == 'filter':
+            try:
+                out.append((op, table_filter.compile_filter(value.strip(), eval if nh == 2 else None)))
+            except ValueError as exc:
+                exit_error(str(exc))
+        else:
+            out.append((op, parse_cols(value, nh)))
+        if op in ('select', 'remove', 'sort') and not out[-1][1]:
+            exit_error(f"The columns of the '{op}' step are missing: {v}")
+    if [ op for op,_ in out[:-1] if op == 'sort' ]:
+        exit_error("The sort has to be the last step")
+    return out
+
+def plan_steps(steps, header):
+    '''
+    Check the columns of every step, and get the columns of the input table that have to be parsed
+    (the columns of the output and the columns used by the steps)
+
+    Returns
+    -------
+    List of columns to parse (in the order of the table).
+    '''
+    cur = list(header)
+    needed = []
+    for i,(op,arg) in enumerate(steps):
+        cols = arg['columns'] if op == 'filter' else arg
+        miss = [ c for c in cols if c not in cur ]
+        if miss:
+            exit_error(f"The columns {miss} of the step {i+1} ({op}) are not in the table")
+        # the columns used by the step (a dedup without columns uses the whole row)
+        if op in ('filter', 'sort'):
+            needed += cols
+        elif op == 'dedup':
+            needed += cols if cols else cur
+        if op == 'select':
+            cur = list(arg)
+        elif op == 'remove':
+            cur = [ c for c in cur if c not in arg ]
+    needed += cur
+    return [ c for c in header if c in needed ]
+
+def run_steps(chunks, steps, numeric_cols=None):
+    '''
+    Apply the streaming steps to every chunk (the final sort is applied afterwards)
+    '''
+    seen = [ set() for _ in steps ]
+    for chunk in chunks:
+        for i,(op,arg) in enumerate(steps):
+            if op == 'filter':
+                chunk = chunk[table_filter.apply_filter(arg, chunk, numeric_cols)]
+            elif op == 'select':
+                # the selected columns that are removed later are not parsed
+                chunk = chunk[[ c for c in arg if c in chunk.columns ]]
+            elif op == 'remove':
+                chunk = chunk.drop(columns=[ c for c in arg if c in chunk.columns ])
+            elif op == 'dedup':
+                chunk = common.drop_seen(chunk, seen[i], arg)
+        yield chunk
+
+
+#################
+# Main function #
+#################
+
+def main(args):
+    '''
+    Main function
+    '''
+    logging.info("getting the input parameters...")
+    conf_args = common.read_config(script_name, args.c)
+    [ print(f"{k} = {v}") for k,v in conf_args.items() ]
+    ifile = conf_args['infile']
+    ofile = conf_args['outfile']
+    nh = common.parse_n_headers(conf_args.get('n_headers', ''))
+    max_memory = float(conf_args['max_memory'])*1024*1024 if conf_args.get('max_memory', '') != '' else None
+    tmpdir = conf_args.get('tmpdir', '') or None
+
+    logging.info("reading the headers of the input file...")
+    nh, header = common.read_header(ifile, nh)
+
+    logging.info(f"planning the steps ({nh} headers)...")
+    steps = get_steps(conf_args, nh)
+    if not steps:
+        exit_error("There are no steps in the pipeline")
+    usecols = plan_steps(steps, header)
+    logging.info(f"{[ op for op,_ in steps ]}: parsing {len(usecols)} of {len(header)} columns")
+
+    # the columns are numeric if all the values of the file are numbers (used by the sort and by the columns
+    # that are compared with other columns in the filters)
+    dtypes = None
+    if steps[-1][0] == 'sort' or [ c for op,arg in steps if op == 'filter' for c in arg['pair_columns'] ]:
+        dtypes = common.infer_dtypes(ifile, nh)
+    numeric_cols = { c: t != 'str' for c,t in dtypes.items() } if dtypes else None
+
+    # the rows are streamed through the steps, and only the final sort materializes (or spills) them
+    if steps[-1][0] == 'sort':
+        cols = steps[-1][1]
+        chunksize = common.CHUNK_SIZE
+        if max_memory:
+            chunksize = external_sort.get_chunksize(next(common.read_table(ifile, nh, usecols=usecols, typed=False, chunksize=external_sort.MIN_BLOCK)), max_memory)
+        chunks = run_steps(common.read_table(ifile, nh, usecols=usecols, typed=False, chunksize=chunksize), steps[:-1], numeric_cols)
+        logging.info(f"applying the steps and sorting by the given columns: {cols}...")
+        external_sort.sort_chunks(chunks, cols, [ numeric_cols[c] for c in cols ], ofile, max_memory, tmpdir)
+    else:
+        logging.info("applying the steps...")
+        with open(ofile, 'w', newline='') as f:
+            for i,chunk in enumerate(run_steps(common.read_table(ifile, nh, usecols=usecols, typed=False), steps, numeric_cols)):
+                chunk.to_csv(f, sep="\t", index=False, header=(i == 0))
+
+
+if __name__ == "__main__":
+    # start main function
+    logging.info('start script: '+"{0}".format(" ".join([x for x in sys.argv])))
+    main(args)
+    logging.info('end script')
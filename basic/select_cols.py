@@ -9,7 +9,6 @@ import sys
 import argparse
 import logging
 import re
-import pandas as pd
 
 #########################
 # Import local packages #
@@ -51,33 +50,28 @@ def main(args):
     [ print(f"{k} = {v}") for k,v in conf_args.items() ]
     ifile = conf_args['infile']
     ofile = conf_args['outfile']
-    nh = int(conf_args['n_headers']) if 'n_headers' in conf_args else 1
+    nh = common.parse_n_headers(conf_args.get('n_headers', ''))
+
+    logging.info("reading the headers of the input file...")
+    nh, header = common.read_header(ifile, nh)
     cols = re.split('\s*;\s*', conf_args['cols']) if args.c and args.c != '' else []
     # if there are 2 headers, convert the lsit of tuples
     cols = [ eval(c) for c in cols ] if nh == 2 else cols
 
-    logging.info(f"reading input files with {nh} headers...")
-    if nh == 2:
-        data = pd.read_csv(ifile, sep="\t", low_memory=False, header=[0,1]) # two headers
-    else:
-        data = pd.read_csv(ifile, sep="\t", low_memory=False, nrows=10)
-
-    logging.info(f"checking the given columns: {cols}")
+    logging.info(f"checking the given columns ({nh} headers): {cols}")
     # get the columns that do not exist in the table
-    cc = [c for c in cols if not c in data.columns]
+    cc = [c for c in cols if not c in header]
     if len(cc) > 0:
         sms = f"The specified columns do not exist in the provided table: {cc}"
         logging.error(sms)
         sys.exit(sms)
 
-    logging.info("selecting the given columns...")
-    data = data[cols]
-    
-    logging.info("removing duplicates...")
-    data = data.drop_duplicates()
-    
-    logging.info("printing the output file...")
-    data.to_csv(ofile, sep="\t", index=False)
+    logging.info("selecting the given columns and removing duplicates...")
+    # only the given columns are parsed
+    seen = set()
+    with open(ofile, 'w', newline='') as f:
+        for i,chunk in enumerate(common.read_table(ifile, nh, usecols=cols, typed=False)):
+            common.drop_seen(chunk, seen).to_csv(f, sep="\t", index=False, header=(i == 0))
 
 
 if __name__ == "__main__":
@@ -16,6 +16,7 @@ import pandas as pd
 #########################
 sys.path.append(f"{os.path.dirname(__file__)}/../libs")
 import common
+import external_sort
 
 ###################
 # Parse arguments #
@@ -52,15 +53,26 @@ def main(args):
     ifile = conf_args['infile']
     cols = re.split('\s*,\s*', conf_args['cols']) if args.c and args.c != '' else []
     ofile = conf_args['outfile']
+    max_memory = conf_args.get('max_memory', '')
+    tmpdir = conf_args.get('tmpdir', '') or None
 
-    logging.info("reading input file...")
-    data = pd.read_csv(ifile, sep="\t", low_memory=False)
+    # the columns are numeric if all the values of the file are numbers (the same types with or without the memory budget)
+    dtypes = common.infer_dtypes(ifile, 1)
+    numeric = [ dtypes[c] != 'str' for c in cols ]
+
+    if max_memory != '':
+        logging.info(f"sorting by the given columns: {cols} with a memory budget of {max_memory} MB...")
+        max_memory = float(max_memory)*1024*1024
+        chunksize = external_sort.get_chunksize(next(common.read_table(ifile, 1, typed=False, chunksize=external_sort.MIN_BLOCK)), max_memory)
+        external_sort.sort_chunks(common.read_table(ifile, 1, typed=False, chunksize=chunksize), cols, numeric, ofile, max_memory, tmpdir)
+        return
 
-    logging.info(f"sorting by the given columns: {cols}...")
-    data.sort_values(cols, ascending=True, inplace=True)
+    logging.info("reading input file...")
+    # the values are printed as they are
+    data = pd.concat(common.read_table(ifile, 1, typed=False), ignore_index=True)
 
-    logging.info("printing the output file...")
-    data.to_csv(ofile, sep="\t", index=False)
+    logging.info(f"sorting by the given columns: {cols} and printing the output file...")
+    external_sort.sort_chunks([data], cols, numeric, ofile)
 
 
 if __name__ == "__main__":
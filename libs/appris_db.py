@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import os
+import json
+import logging
+
+#########################
+# Import local packages #
+#########################
+import common
+import tabix
+import interval_index
+
+####################
+# Global variables #
+####################
+
+# version of the bgzip/tabix files built by SANPRO (rebuild them if it changes)
+TABIX_VERSION = 1
+
+####################
+# Common functions #
+####################
+
+def get_files(ifile):
+    '''
+    Files of the indexes of the APPRIS database
+    '''
+    return {
+        'bgzip': f"{ifile}.gz",
+        'tbi': f"{ifile}.gz.tbi",
+        'manifest': f"{ifile}.gz.json",
+        'idx': f"{ifile}.idx"
+    }
+
+def source_manifest(ifile):
+    '''
+    Size, mtime and content checksum of the source file
+    '''
+    return {'checksum': common.file_checksum(ifile), **common.file_stamp(ifile)}
+
+def check_source(manifest, ifile):
+    '''
+    Check if the index was built from the current content of the source file.
+    The checksum is only computed if the size/mtime of the source file changed.
+
+    Returns the source manifest (with the refreshed size/mtime), or None if the index is stale.
+    '''
+    source = manifest.get('source') if manifest else None
+    if not source:
+        return None
+    stamp = common.file_stamp(ifile)
+    if source.get('size') == stamp['size'] and source.get('mtime') == stamp['mtime']:
+        return source
+    if source.get('checksum') != common.file_checksum(ifile):
+        return None
+    return {**source, **stamp}
+
+def _save_manifest(json_file, manifest):
+    try:
+        with open(f"{json_file}.tmp", 'w') as f:
+            json.dump(manifest, f)
+        os.replace(f"{json_file}.tmp", json_file)
+    except OSError as exc:
+        logging.warning(f"The manifest of the index has not been saved: {exc}")
+
+def build_tabix(ifile, n_threads=1, force=False):
+    '''
+    Sort and compress the APPRIS database into a bgzip file with its tabix index (gff columns).
+    The files are rebuilt when the content of the database changes.
+
+    Returns the files of the indexes and the checksum of the database.
+    '''
+    files = get_files(ifile)
+    manifest = None
+    if not force and all([os.path.exists(files[k]) for k in ('bgzip','tbi','manifest')]):
+        with open(files['manifest']) as f:
+            manifest = json.load(f)
+        if manifest.get('version') != TABIX_VERSION:
+            manifest = None
+    source = check_source(manifest, ifile)
+    if source is not None:
+        logging.info("caching a bgzip and tabix file")
+        if source != manifest['source']:
+            _save_manifest(files['manifest'], {**manifest, 'source': source})
+        return {**files, 'checksum': source['checksum']}
+
+    logging.info("sorting and creating a bgzip and tabix file...")
+    source = source_manifest(ifile)
+    header, names, tids, begs, ends, lines = interval_index.read_records(ifile)
+    tabix.write_tabix(files['bgzip'], header, [n.decode('utf-8') for n in names], tids, begs, ends, lines, n_threads)
+    _save_manifest(files['manifest'], {'version': TABIX_VERSION, 'source': source})
+    return {**files, 'checksum': source['checksum']}
+
+def build_interval_index(ifile, force=False):
+    '''
+    Compile the APPRIS database into the interval index (memory-mappable folder of arrays).
+    The index is rebuilt when the content of the database changes.
+
+    Returns the files of the indexes and the checksum of the database.
+    '''
+    files = get_files(ifile)
+    manifest = None if force else interval_index.read_manifest(files['idx'])
+    source = check_source(manifest, ifile)
+    if source is not None:
+        logging.info("caching an interval index")
+        if source != manifest['source']:
+            _save_manifest(os.path.join(files['idx'], 'manifest.json'), {**manifest, 'source': source})
+        return {**files, 'checksum': source['checksum']}
+
+    logging.info("creating an interval index...")
+    source = source_manifest(ifile)
+    interval_index.save_index(interval_index.build_index(ifile), files['idx'], {'source': source})
+    return {**files, 'checksum': source['checksum']}
+
+
+if __name__ == "__main__":
+	print("It is a library used by SANPRO programs")
@@ -4,7 +4,13 @@
 """
 
 # import global modules
+import os
+import json
+import hashlib
+import logging
 import configparser
+import numpy as np
+import pandas as pd
 
 #########################
 # Import local packages #
@@ -14,6 +20,17 @@ import configparser
 # Global variables #
 ####################
 
+# values considered as missing in the iSanXoT tables (besides the pandas defaults)
+NA_VALUES = ['NA', 'excluded']
+# number of rows read at once
+CHUNK_SIZE = 100000
+# values of the second header row of the iSanXoT tables (used to detect the two headers)
+HEADER_LEVELS = ['LEVEL', 'REL', 'STATS']
+# version of the cached dtypes (infer them again if it changes)
+DTYPES_VERSION = 1
+# regular expression of the integer values
+INT_RE = r'^\s*[-+]?\d+\s*$'
+
 ####################
 # Common functions #
 ####################
@@ -24,6 +41,144 @@ def read_config(name, cfile):
     args = { k: v.strip('"') for k,v in config[name].items() }
     return args
 
+def file_checksum(ifile, chunksize=1<<24):
+    '''
+    Content checksum (SHA-1) of the given file, read in blocks
+    '''
+    h = hashlib.sha1()
+    with open(ifile, 'rb') as f:
+        for b in iter(lambda: f.read(chunksize), b''):
+            h.update(b)
+    return h.hexdigest()
+
+def file_stamp(ifile):
+    '''
+    Size and modification time of the given file
+    '''
+    st = os.stat(ifile)
+    return {'size': st.st_size, 'mtime': st.st_mtime_ns}
+
+def _is_numeric(s):
+    '''
+    True if all the values of the column (text) are numbers
+    '''
+    return bool(pd.to_numeric(s.dropna(), errors='coerce').notna().all())
+
+def count_headers(ifile):
+    '''
+    Detect the number of header rows of the table (1, or 2 for the iSanXoT tables with two headers).
+    There are two headers if all the values of the second row are levels of the iSanXoT tables (HEADER_LEVELS).
+    '''
+    with open(ifile, 'r', newline='') as f:
+        f.readline()
+        row = f.readline().rstrip('\r\n').split('\t')
+    return 2 if all([ c.strip() in HEADER_LEVELS for c in row ]) else 1
+
+def parse_n_headers(value):
+    '''
+    Number of header rows given in the config: 1 by default, or None if they are detected from the table ('auto')
+    '''
+    value = value.strip()
+    if value.lower() == 'auto':
+        return None
+    return int(value) if value != '' else 1
+
+def read_header(ifile, n_headers=None):
+    '''
+    Number of header rows (detected if it is not given) and columns of the table (tuples with two headers)
+    '''
+    if not n_headers:
+        n_headers = count_headers(ifile)
+    cols = pd.read_csv(ifile, sep="\t", header=[0,1] if n_headers == 2 else 0, nrows=0).columns.tolist()
+    return n_headers, cols
+
+def infer_dtypes(ifile, n_headers=None, na_values=NA_VALUES, chunksize=CHUNK_SIZE):
+    '''
+    Types of the columns of the whole table: Int64 (integers), float64 (numbers) or str.
+    They are cached next to the table (<file>.dtypes.json) until the size/mtime of the table changes.
+
+    Returns
+    -------
+    Dictionary (column -> dtype).
+    '''
+    n_headers, cols = read_header(ifile, n_headers)
+    json_file = f"{ifile}.dtypes.json"
+    if os.path.exists(json_file):
+        with open(json_file) as f:
+            cache = json.load(f)
+        if cache.get('version') == DTYPES_VERSION and cache.get('source') == file_stamp(ifile) and \
+           cache.get('n_headers') == n_headers and cache.get('na_values') == list(na_values) and len(cache.get('dtypes', [])) == len(cols):
+            return dict(zip(cols, cache['dtypes']))
+    logging.info(f"inferring the types of the columns of {ifile}...")
+    is_num = [True]*len(cols)
+    is_int = [True]*len(cols)
+    for chunk in pd.read_csv(ifile, sep="\t", header=None, skiprows=n_headers, dtype=str, na_values=na_values, chunksize=chunksize):
+        for i in range(len(cols)):
+            if not is_num[i] or i >= chunk.shape[1]:
+                continue
+            s = chunk.iloc[:,i].dropna()
+            is_num[i] = _is_numeric(s)
+            is_int[i] = is_num[i] and is_int[i] and bool(s.str.match(INT_RE).all())
+    dtypes = [ ('Int64' if i else 'float64') if n else 'str' for n,i in zip(is_num, is_int) ]
+    try:
+        with open(f"{json_file}.tmp", 'w') as f:
+            json.dump({'version': DTYPES_VERSION, 'source': file_stamp(ifile), 'n_headers': n_headers, 'na_values': list(na_values), 'dtypes': dtypes}, f)
+        os.replace(f"{json_file}.tmp", json_file)
+    except OSError as exc:
+        logging.warning(f"The types of the columns have not been cached: {exc}")
+    return dict(zip(cols, dtypes))
+
+def read_table(ifile, n_headers=None, usecols=None, typed=True, na_values=NA_VALUES, chunksize=CHUNK_SIZE):
+    '''
+    Read the table (tabular-separated, with one or two header rows) by chunks
+
+    Parameters
+    ----------
+    ifile : str, table file
+    n_headers : int, number of header rows (detected if it is not given)
+    usecols : list of columns (tuples with two headers) to parse, in the given order. By default, all the columns
+    typed : bool, parse the values with the types of the whole table (see infer_dtypes), so all the chunks have
+        the same schema and the NA_VALUES are missing values. Otherwise, the values are kept as text
+        (only the empty values are missing)
+    chunksize : int, number of rows per chunk
+
+    Returns
+    -------
+    Generator of dataframes.
+    '''
+    n_headers, cols = read_header(ifile, n_headers)
+    usecols = cols if usecols is None else list(usecols)
+    miss = [ c for c in usecols if c not in cols ]
+    if miss:
+        raise KeyError(f"The specified columns do not exist in the provided table: {miss}")
+    idx = [ cols.index(c) for c in usecols ]
+    out_cols = pd.MultiIndex.from_tuples(usecols) if n_headers == 2 else usecols
+    if typed:
+        dtypes = infer_dtypes(ifile, n_headers, na_values, chunksize)
+        kwargs = {'dtype': { i: dtypes[cols[i]] for i in idx }, 'na_values': na_values}
+    else:
+        kwargs = {'dtype': str, 'keep_default_na': False, 'na_values': ['']}
+    n = 0
+    for chunk in pd.read_csv(ifile, sep="\t", header=None, skiprows=n_headers, usecols=idx, chunksize=chunksize, **kwargs):
+        chunk = chunk[idx]
+        chunk.columns = out_cols
+        n += 1
+        yield chunk
+    # empty table
+    if n == 0:
+        yield pd.DataFrame(columns=out_cols, dtype=str)
+
+def drop_seen(chunk, seen, cols=None):
+    '''
+    Remove the rows of the chunk that are duplicated (in the given columns, or the whole row), within the chunk
+    or in the previous chunks. The set 'seen' keeps the 64-bit digests of the rows already returned.
+    '''
+    digests = pd.util.hash_pandas_object(chunk[cols] if cols else chunk, index=False).to_numpy()
+    mask = ~pd.Series(digests).duplicated().to_numpy()
+    mask &= np.array([ d not in seen for d in digests.tolist() ], dtype=bool)
+    seen.update(digests[mask].tolist())
+    return chunk[mask]
+
 
 if __name__ == "__main__":
 	print("It is a library used by SANPRO programs")
\ No newline at end of file
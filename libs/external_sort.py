@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import os
+import pickle
+import logging
+import tempfile
+import numpy as np
+import pandas as pd
+
+#########################
+# Import local packages #
+#########################
+import common
+
+####################
+# Global variables #
+####################
+
+# minimum number of rows of the blocks of the sorted runs
+MIN_BLOCK = 1000
+# number of chunks read within the memory budget
+N_CHUNKS = 8
+# number of blocks of every sorted run (the runs are read block by block in the merge)
+N_BLOCKS = 64
+# name of the auxiliary columns: sort keys and position of the row in the input
+KEY_COL = '__key{}'
+POS_COL = '__pos'
+
+####################
+# Common functions #
+####################
+
+def add_keys(df, key_idx, numeric):
+    '''
+    Add the sort keys to the chunk (text values): the numeric columns are compared as numbers, otherwise as text.
+    The missing values (common.NA_VALUES) go to the end.
+    '''
+    for i,(c,n) in enumerate(zip(key_idx, numeric)):
+        key = df[c].mask(df[c].isin(common.NA_VALUES))
+        df[KEY_COL.format(i)] = pd.to_numeric(key, errors='coerce') if n else key
+    return df
+
+def sort_chunk(df, n_keys):
+    '''
+    Sort the chunk by the keys (the ties keep the order of the input)
+    '''
+    return df.sort_values([KEY_COL.format(i) for i in range(n_keys)]+[POS_COL], kind='stable', na_position='last')
+
+def write_run(df, ofile, block_size):
+    '''
+    Spill the sorted chunk into a temporary file, in blocks
+    '''
+    with open(ofile, 'wb') as f:
+        for i in range(0, len(df), block_size):
+            pickle.dump(df.iloc[i:i+block_size], f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def read_run(ifile):
+    '''
+    Read the blocks of the sorted run
+    '''
+    with open(ifile, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+def merge_runs(runs, n_keys, f, n_cols):
+    '''
+    K-way merge of the sorted runs into the output file.
+    In every step, the buffered rows are merged and those that are not greater than the last buffered row
+    of any run with pending data are printed.
+    '''
+    readers = [ read_run(run_file) for run_file in runs ]
+    buffers = [ next(r, None) for r in readers ]
+    active = [ b is not None for b in buffers ]
+    while any([ b is not None and len(b) > 0 for b in buffers ]):
+        merged = sort_chunk(pd.concat([ b for b in buffers if b is not None and len(b) > 0 ]), n_keys)
+        # the cutoff is the smallest last row of the runs with pending data
+        lasts = [ b.iloc[[-1]] for b,a in zip(buffers, active) if a and len(b) > 0 ]
+        if lasts:
+            cutoff = sort_chunk(pd.concat(lasts), n_keys)[POS_COL].iloc[0]
+            n = int(np.flatnonzero(merged[POS_COL].to_numpy() == cutoff)[0]) + 1
+        else:
+            n = len(merged)
+        merged.iloc[:n][list(range(n_cols))].to_csv(f, sep="\t", index=False, header=False)
+        # keep the rest of the rows in the buffers, and refill the empty ones
+        rest = merged.iloc[n:]
+        for i,r in enumerate(readers):
+            if buffers[i] is None:
+                continue
+            buffers[i] = rest[rest[POS_COL].isin(buffers[i][POS_COL])]
+            if len(buffers[i]) == 0 and active[i]:
+                b = next(r, None)
+                if b is None:
+                    active[i] = False
+                else:
+                    buffers[i] = b
+
+def get_chunksize(sample, max_memory):
+    '''
+    Number of rows per chunk, so several chunks fit in the memory budget (estimated from a sample of rows)
+    '''
+    row_bytes = max(1, int(sample.memory_usage(index=True, deep=True).sum() / max(1, len(sample))))
+    return max(MIN_BLOCK, int(max_memory / row_bytes / N_CHUNKS))
+
+def sort_chunks(chunks, cols, numeric, ofile, max_memory=None, tmpdir=None):
+    '''
+    Sort the rows of the chunks (values as text) and print them into the output file.
+    Without a memory budget, the rows are sorted in memory. Otherwise, the chunks are sorted in runs that fit
+    in the budget, spilled into temporary files, and merged.
+
+    Parameters
+    ----------
+    chunks : iterable of dataframes with the same columns (tuples with two headers)
+    cols : list of columns used to sort
+    numeric : list of bool, the sort columns that are compared as numbers
+    ofile : str, output file
+    max_memory : float, memory budget in bytes
+    tmpdir : str, folder of the temporary files
+    '''
+    header, key_idx = None, None
+    runs, buffer, size, pos = [], [], 0, 0
+    with tempfile.TemporaryDirectory(dir=tmpdir) as tdir, open(ofile, 'w', newline='') as f:
+
+        def spill():
+            df = sort_chunk(add_keys(pd.concat(buffer), key_idx, numeric), len(cols))
+            run_file = os.path.join(tdir, f"run{len(runs)}.pkl")
+            write_run(df, run_file, max(MIN_BLOCK, len(df) // N_BLOCKS))
+            runs.append(run_file)
+            logging.info(f"sorted run {len(runs)} with {pos} rows in total")
+
+        for chunk in chunks:
+            if header is None:
+                header = chunk.columns
+                key_idx = [ header.get_loc(c) for c in cols ]
+                # the header rows
+                chunk.iloc[:0].to_csv(f, sep="\t", index=False)
+            # the columns are referenced by position (also with two headers)
+            chunk = chunk.set_axis(range(len(header)), axis=1)
+            chunk[POS_COL] = np.arange(pos, pos+len(chunk))
+            pos += len(chunk)
+            buffer.append(chunk)
+            # the sort needs about twice the memory of the chunk
+            if max_memory:
+                size += chunk.memory_usage(index=True, deep=True).sum()
+                if size * 2 >= max_memory:
+                    spill()
+                    buffer, size = [], 0
+        if header is None:
+            return
+        if not runs:
+            if buffer:
+                df = sort_chunk(add_keys(pd.concat(buffer), key_idx, numeric), len(cols))
+                df[list(range(len(header)))].to_csv(f, sep="\t", index=False, header=False)
+            return
+        if buffer:
+            spill()
+        logging.info(f"merging {len(runs)} sorted runs...")
+        merge_runs(runs, len(cols), f, len(header))
+
+
+if __name__ == "__main__":
+	print("It is a library used by SANPRO programs")
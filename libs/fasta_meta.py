@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import os
+import json
+import logging
+import mmap
+import numpy as np
+
+#########################
+# Import local packages #
+#########################
+import common
+
+####################
+# Global variables #
+####################
+
+# version of the sidecar layout (rebuild the sidecar if it changes)
+META_VERSION = 2
+
+####################
+# Common functions #
+####################
+
+def get_accession(header):
+    '''
+    Protein id from the FASTA header (the same key used with pyfaidx)
+    Example: >sp|P12345|NAME_HUMAN desc -> P12345
+    '''
+    name = header.split()[0] if header.split() else ''
+    x = name.split('|')
+    return x[1] if len(x) > 1 else x[0]
+
+def _sidecar_files(ifile):
+    return f"{ifile}.meta.npy", f"{ifile}.meta.json"
+
+def build_meta(ifile, mw_function):
+    '''
+    Scan the FASTA file and create the metadata array
+
+    Parameters
+    ----------
+    ifile : str, FASTA file
+    mw_function : function that calculates the molecular weights from a list of sequences
+
+    Returns
+    -------
+    Structured numpy array with the accession, byte offset, number of bytes, length and molecular weight of every protein.
+    '''
+    accs, offsets, nbytes, lens, seqs = [], [], [], [], []
+    seq = []
+    pos = 0
+    with open(ifile, 'rb') as f:
+        for line in f:
+            if line.startswith(b'>'):
+                if accs:
+                    nbytes.append(pos - offsets[-1])
+                    seqs.append(b''.join(seq).decode('latin-1'))
+                accs.append(get_accession(line[1:].decode('latin-1')))
+                offsets.append(pos + len(line))
+                seq = []
+            elif accs:
+                seq.append(line.strip())
+            pos += len(line)
+    if accs:
+        nbytes.append(pos - offsets[-1])
+        seqs.append(b''.join(seq).decode('latin-1'))
+    lens = [len(s) for s in seqs]
+    mws = mw_function(seqs)
+    # keep the first occurrence of duplicated accessions
+    _,idx = np.unique(np.array(accs, dtype=object).astype(str), return_index=True)
+    if len(idx) < len(accs):
+        logging.warning(f"There are {len(accs)-len(idx)} duplicated protein ids in the FASTA file. The first occurrence is kept")
+    idx = np.sort(idx)
+    width = max([len(a.encode('utf-8')) for a in accs]) if accs else 1
+    meta = np.zeros(len(idx), dtype=[('acc', f"S{width}"), ('offset', 'i8'), ('nbytes', 'i8'), ('length', 'i8'), ('mw', 'f8')])
+    meta['acc'] = [accs[i].encode('utf-8') for i in idx]
+    meta['offset'] = np.array(offsets, dtype=np.int64)[idx]
+    meta['nbytes'] = np.array(nbytes, dtype=np.int64)[idx]
+    meta['length'] = np.array(lens, dtype=np.int64)[idx]
+    meta['mw'] = np.array(mws, dtype=np.float64)[idx]
+    return meta
+
+def _save_manifest(json_file, manifest):
+    try:
+        with open(f"{json_file}.tmp", 'w') as f:
+            json.dump(manifest, f)
+        os.replace(f"{json_file}.tmp", json_file)
+    except OSError as exc:
+        logging.warning(f"The manifest of fasta metadata has not been saved: {exc}")
+
+def load_meta(ifile, mw_function):
+    '''
+    Load the metadata sidecar of the FASTA file (memory-mapped). The sidecar is created once
+    and rebuilt when the content checksum of the FASTA file changes.
+    '''
+    npy_file, json_file = _sidecar_files(ifile)
+    stamp = common.file_stamp(ifile)
+    manifest = None
+    if os.path.exists(npy_file) and os.path.exists(json_file):
+        with open(json_file) as f:
+            manifest = json.load(f)
+        if manifest.get('version') != META_VERSION:
+            manifest = None
+        # the size/mtime avoids the checksum when the FASTA file has not been touched
+        elif manifest.get('size') != stamp['size'] or manifest.get('mtime') != stamp['mtime']:
+            if manifest.get('checksum') != common.file_checksum(ifile):
+                manifest = None
+            else:
+                _save_manifest(json_file, {**manifest, **stamp})
+    if manifest is not None:
+        logging.info("caching the metadata of fasta file")
+        return np.load(npy_file, mmap_mode='r')
+
+    logging.info("creating the metadata of fasta file...")
+    meta = build_meta(ifile, mw_function)
+    manifest = {'version': META_VERSION, 'checksum': common.file_checksum(ifile), **stamp}
+    try:
+        with open(f"{npy_file}.tmp", 'wb') as f:
+            np.save(f, meta)
+        os.replace(f"{npy_file}.tmp", npy_file)
+    except OSError as exc:
+        logging.warning(f"The metadata of fasta file has not been saved: {exc}")
+        return meta
+    _save_manifest(json_file, manifest)
+    return meta
+
+def filter_meta(meta, proteins):
+    '''
+    Get the metadata of the given proteins
+    '''
+    width = meta.dtype['acc'].itemsize
+    # discard the ids longer than the stored ones (they would be truncated)
+    keys = [q.encode('utf-8') for q in proteins if isinstance(q, str) and q != '']
+    keys = np.array([q for q in keys if len(q) <= width], dtype=meta.dtype['acc'])
+    return meta[np.isin(meta['acc'], keys)]
+
+def read_seqs(ifile, meta):
+    '''
+    Read the protein sequences given by the metadata (dictionary: protein id -> sequence)
+    '''
+    seqs = {}
+    if len(meta) == 0:
+        return seqs
+    with open(ifile, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for r in np.sort(meta, order='offset'):
+            b = mm[int(r['offset']):int(r['offset'])+int(r['nbytes'])]
+            seqs[r['acc'].decode('utf-8')] = b''.join(b.split()).decode('latin-1')
+    return seqs
+
+
+if __name__ == "__main__":
+	print("It is a library used by SANPRO programs")
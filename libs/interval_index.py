@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import os
+import json
+import shutil
+import numpy as np
+
+#########################
+# Import local packages #
+#########################
+import tabix
+
+####################
+# Global variables #
+####################
+
+# version of the index layout (rebuild the index if it changes)
+INDEX_VERSION = 1
+# columns of the sequence name, start and end (0-based) of the records (gff: 1-based and inclusive coordinates)
+COL_SEQ, COL_BEG, COL_END = 0, 3, 4
+# arrays of the index (saved as .npy files within the index folder)
+INDEX_ARRAYS = ('names', 'name_offsets', 'maxlen', 'keys', 'ends', 'row_offsets', 'rows')
+
+####################
+# Common functions #
+####################
+
+def read_records(ifile, meta='#'):
+    '''
+    Read the records of the annotation file (tabular, gff coordinates) sorted by name and start
+    (keeping the order of the file for the ties)
+
+    Returns
+    -------
+    Tuple with the header lines, the sorted sequence names, and the name index, 0-based start,
+    0-based exclusive end and line (bytes, without the newline) of the sorted records.
+    '''
+    header, names, begs, ends, lines = [], [], [], [], []
+    meta = meta.encode('utf-8')
+    with open(ifile, 'rb') as f:
+        for line in f:
+            line = line.rstrip(b'\n')
+            if line.startswith(meta):
+                header.append(line)
+                continue
+            if line == b'':
+                continue
+            fields = line.split(b'\t', COL_END+1)
+            names.append(fields[COL_SEQ])
+            begs.append(int(fields[COL_BEG]) - 1)
+            ends.append(int(fields[COL_END]))
+            lines.append(line)
+    begs = np.maximum(np.array(begs, dtype=np.int64), 0)
+    ends = np.maximum(np.array(ends, dtype=np.int64), begs + 1)
+    unames, name_ids = np.unique(np.array(names, dtype=bytes), return_inverse=True)
+    name_ids = name_ids.reshape(-1).astype(np.int64)
+    order = np.lexsort((begs, name_ids))
+    return header, unames, name_ids[order], begs[order], ends[order], [ lines[i] for i in order.tolist() ]
+
+def build_index(ifile, meta='#'):
+    '''
+    Compile the annotation file (tabular, gff coordinates) into an interval index
+
+    Returns
+    -------
+    Dictionary of arrays:
+        names: sorted sequence names
+        name_offsets: range of the records of every name
+        maxlen: length of the longest record of every name
+        keys: sorted keys of the records (name index << 32 | 0-based start)
+        ends: 0-based exclusive end of the records
+        row_offsets, rows: lines of the records (column store of bytes)
+    '''
+    _, unames, name_ids, begs, ends, rows = read_records(ifile, meta)
+    name_offsets = np.searchsorted(name_ids, np.arange(len(unames)+1), side='left').astype(np.int64)
+    maxlen = np.zeros(len(unames), dtype=np.int64)
+    np.maximum.at(maxlen, name_ids, ends - begs)
+    row_offsets = np.concatenate(([0], np.cumsum([len(r) for r in rows]))).astype(np.int64)
+    return {
+        'names': unames,
+        'name_offsets': name_offsets,
+        'maxlen': maxlen,
+        'keys': (name_ids << 32) | begs,
+        'ends': ends,
+        'row_offsets': row_offsets,
+        'rows': np.frombuffer(b''.join(rows), dtype=np.uint8)
+    }
+
+def save_index(index, idx_dir, manifest=None):
+    '''
+    Save the arrays of the index into a folder (replaced atomically)
+    '''
+    tmp_dir = f"{idx_dir}.tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    for k in INDEX_ARRAYS:
+        np.save(os.path.join(tmp_dir, f"{k}.npy"), index[k])
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+        json.dump({'version': INDEX_VERSION, **(manifest if manifest else {})}, f)
+    if os.path.exists(idx_dir):
+        shutil.rmtree(idx_dir)
+    os.replace(tmp_dir, idx_dir)
+
+def read_manifest(idx_dir):
+    '''
+    Manifest of the index folder (None if it does not exist or its version is different)
+    '''
+    json_file = os.path.join(idx_dir, 'manifest.json')
+    if not os.path.exists(json_file):
+        return None
+    with open(json_file) as f:
+        manifest = json.load(f)
+    return manifest if manifest.get('version') == INDEX_VERSION else None
+
+def load_index(idx_dir):
+    '''
+    Open the arrays of the index folder (memory-mapped)
+    '''
+    return { k: np.load(os.path.join(idx_dir, f"{k}.npy"), mmap_mode='r') for k in INDEX_ARRAYS }
+
+def _has_name(names, name):
+    '''
+    True if the name is within the sorted sequence names
+    '''
+    name = name.encode('utf-8')
+    i = int(np.searchsorted(names, name))
+    return i < len(names) and names[i] == name
+
+def query(index, regions):
+    '''
+    Retrieve the records overlapping every region, for all the regions at once
+
+    Parameters
+    ----------
+    index : dictionary of arrays (see build_index)
+    regions : list of str, 'name', 'name:beg' or 'name:beg-end' (1-based, inclusive)
+
+    Returns
+    -------
+    Dictionary (region -> list of lines), with the same records than a tabix query.
+    '''
+    out = { r: [] for r in regions }
+    names = index['names']
+    if len(names) == 0:
+        return out
+    # parse the regions
+    regs = []
+    for r in out:
+        reg = tabix.parse_region(r)
+        # the region could be just a name that contains ':' (only if it has no valid coordinates of an existing name)
+        if ':' in r and (reg is None or not _has_name(names, reg[0])) and _has_name(names, r):
+            reg = (r, 0, tabix.MAX_POS)
+        if reg is None:
+            continue
+        regs.append((r, *reg))
+    if not regs:
+        return out
+    qnames = np.array([ x[1].encode('utf-8') for x in regs ], dtype=bytes)
+    qbeg = np.array([ x[2] for x in regs ], dtype=np.int64)
+    qend = np.array([ x[3] for x in regs ], dtype=np.int64)
+    # index of the sequence names
+    qidx = np.searchsorted(names, qnames)
+    found = qidx < len(names)
+    found[found] = names[qidx[found]] == qnames[found]
+    qsel = np.flatnonzero(found)
+    qidx, qbeg, qend = qidx[qsel], qbeg[qsel], qend[qsel]
+    # candidate records: start < region end, and start > region start - longest record of the name
+    keys = index['keys']
+    hi = np.searchsorted(keys, (qidx << 32) | qend, side='left')
+    lo = np.searchsorted(keys, (qidx << 32) | np.maximum(qbeg - np.asarray(index['maxlen'])[qidx] + 1, 0), side='left')
+    counts = np.maximum(hi - lo, 0)
+    qrep = np.repeat(np.arange(len(qsel)), counts)
+    rec = lo[qrep] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    ok = np.asarray(index['ends'])[rec] > qbeg[qrep]
+    qrep, rec = qrep[ok], rec[ok]
+    # extract the lines of the records
+    rows = memoryview(index['rows'])
+    rbeg = np.asarray(index['row_offsets'])[rec].tolist()
+    rend = np.asarray(index['row_offsets'])[rec+1].tolist()
+    for q,b,e in zip(qsel[qrep].tolist(), rbeg, rend):
+        out[regs[q][0]].append(str(rows[b:e], 'utf-8'))
+    return out
+
+
+if __name__ == "__main__":
+	print("It is a library used by SANPRO programs")
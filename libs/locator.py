@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+from itertools import repeat
+import numpy as np
+
+#########################
+# Import local packages #
+#########################
+import fasta_meta
+
+####################
+# Global variables #
+####################
+
+# maximum length of the k-mer used as seed in the index (5 bits per residue fits in int64)
+KMER_MAX = 12
+# minimum length of the k-mer used as seed in the index (the shorter peptides are searched with str.find)
+KMER_MIN = 4
+# separator between the protein sequences in the concatenated proteome (ord('@') & 31 == 0)
+SEP = '@'
+
+####################
+# Common functions #
+####################
+
+def _encode(s):
+    '''
+    Convert a string into an array of residue codes (5 bits per residue)
+    '''
+    return np.frombuffer(s.encode('latin-1'), dtype=np.uint8).astype(np.int64) & 31
+
+def _kmer_codes(c, k):
+    '''
+    Rolling k-mer codes for all the windows of the array of residue codes
+    '''
+    n = len(c) - k + 1
+    if n <= 0:
+        return np.empty(0, dtype=np.int64)
+    codes = np.zeros(n, dtype=np.int64)
+    for j in range(k):
+        codes = (codes << 5) | c[j:j+n]
+    return codes
+
+def _concat(seqs):
+    '''
+    Concatenate the protein sequences into the proteome (separated by SEP)
+
+    Returns
+    -------
+    Tuple with the protein ids, their offsets in the proteome, and the proteome.
+    '''
+    ids = list(seqs.keys())
+    lens = np.array([len(seqs[q]) for q in ids], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lens + 1)[:-1])) if len(ids) > 0 else np.empty(0, dtype=np.int64)
+    return ids, offsets, SEP.join([seqs[q] for q in ids])
+
+def build_index(seqs, k):
+    '''
+    Build a k-mer index (partial suffix array) over the concatenated protein sequences
+
+    Parameters
+    ----------
+    seqs : dict (protein id -> sequence)
+    k : int, length of the k-mer seed
+
+    Returns
+    -------
+    Dictionary with the concatenated proteome, the protein ids and offsets, and the
+    sorted k-mer codes together with their positions in the proteome.
+    '''
+    ids, offsets, proteome = _concat(seqs)
+    codes = _kmer_codes(_encode(proteome), k)
+    order = np.argsort(codes, kind='stable')
+    return {
+        'k': k,
+        'ids': ids,
+        'offsets': offsets,
+        'proteome': proteome,
+        'codes': codes[order],
+        'order': order
+    }
+
+def _search_index(proteome, codes, k, peps):
+    '''
+    Sorted start positions (in the proteome) of the peptides, which are not shorter than the seed.
+    The k-mer codes of the proteome are sorted here (the index of this seed length).
+    '''
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    # get the range of candidates for all the peptides at once
+    pcodes = np.array([_kmer_codes(_encode(p[:k]), k)[0] for p in peps], dtype=np.int64)
+    lo = np.searchsorted(codes, pcodes, side='left')
+    hi = np.searchsorted(codes, pcodes, side='right')
+    # verify the whole peptide for each candidate
+    return [ [c for c in np.sort(order[l:h]).tolist() if proteome.startswith(p, c)] for p,l,h in zip(peps, lo, hi) ]
+
+def _search_find(proteome, peps):
+    '''
+    Sorted start positions (in the proteome) of the peptides, with str.find
+    '''
+    out = []
+    for p in peps:
+        starts = []
+        c = proteome.find(p)
+        while c != -1:
+            starts.append(c)
+            c = proteome.find(p, c + 1)
+        out.append(starts)
+    return out
+
+def locate_peptides(seqs, peptides):
+    '''
+    Find every occurrence of every unique peptide within the given protein sequences in one pass
+
+    Parameters
+    ----------
+    seqs : dict (protein id -> sequence)
+    peptides : iterable of str
+
+    Returns
+    -------
+    Dictionary (peptide -> dictionary (protein id -> sorted list of 0-based start positions)).
+    '''
+    peptides = list(set([p for p in peptides if isinstance(p, str)]))
+    hits = { p: {} for p in peptides }
+    # the empty peptides are found at the beginning of every sequence (as str.find does)
+    peps = [p for p in peptides if p != '']
+    if '' in hits:
+        hits[''] = { q: [0] for q in seqs }
+    if not peps or not seqs:
+        return hits
+    # the peptides are grouped by the length of their seed (one index per length), so a short peptide does not
+    # shrink the seed of the others. The peptides shorter than KMER_MIN are searched with str.find
+    groups = {}
+    for p in peps:
+        groups.setdefault(min(KMER_MAX, len(p)), []).append(p)
+    # the proteome is concatenated and encoded once, and the k-mer codes are extended from one length to the next
+    ids, offsets, proteome = _concat(seqs)
+    encoded, codes, kc = None, None, 0
+    for k,kpeps in sorted(groups.items()):
+        if k < KMER_MIN:
+            starts = _search_find(proteome, kpeps)
+        else:
+            if encoded is None:
+                encoded = _encode(proteome)
+                codes, kc = _kmer_codes(encoded, k), k
+            while kc < k:
+                codes = (codes[:-1] << 5) | encoded[kc:]
+                kc += 1
+            starts = _search_index(proteome, codes, k, kpeps)
+        for p,cand in zip(kpeps, starts):
+            if not cand:
+                continue
+            cidx = np.searchsorted(offsets, cand, side='right') - 1
+            for c,i in zip(cand, cidx.tolist()):
+                hits[p].setdefault(ids[i], []).append(c - int(offsets[i]))
+    return hits
+
+def locate_peptides_in_fasta(ifile, meta, peptides):
+    '''
+    Find the peptides within the proteins given by the FASTA metadata.
+    The sequences are read from the memory-mapped FASTA file, so it can be used as a worker of a process pool.
+    '''
+    return locate_peptides(fasta_meta.read_seqs(ifile, meta), peptides)
+
+def locate_peptides_sharded(ifile, meta, pairs, executor, n_workers):
+    '''
+    Find the peptides within their proteins sharding the proteins across a pool of processes
+
+    Parameters
+    ----------
+    ifile : str, FASTA file
+    meta : FASTA metadata of the proteins in use
+    pairs : iterable of tuples (peptide, protein id)
+    executor : concurrent.futures.Executor
+    n_workers : int, number of shards
+
+    Returns
+    -------
+    The same dictionary than locate_peptides. The shards are merged in a deterministic order.
+    '''
+    accs = [a.decode('utf-8') for a in meta['acc']]
+    # balance the shards by the sequence length (round-robin over the longest proteins first)
+    order = np.argsort(-np.asarray(meta['length']), kind='stable')
+    shard = np.empty(len(accs), dtype=np.int64)
+    shard[order] = np.arange(len(accs)) % n_workers
+    shard_of = dict(zip(accs, shard.tolist()))
+    # the peptides of every shard
+    peps = [set() for _ in range(n_workers)]
+    for p,q in pairs:
+        if q in shard_of:
+            peps[shard_of[q]].add(p)
+    metas = [meta[shard == i] for i in range(n_workers)]
+    results = executor.map(locate_peptides_in_fasta, repeat(ifile), metas, [sorted(x) for x in peps])
+    # merge the results (the proteins do not overlap between shards)
+    hits = {}
+    for res in results:
+        for p,h in res.items():
+            hits.setdefault(p, {}).update(h)
+    return hits
+
+def get_peptide_pos(hits, p, q, all_hits=False):
+    '''
+    Get the 1-based start/end positions of the peptide within the protein
+
+    Returns a list of tuples. If the peptide is not found, the str.find behaviour is kept (-1 + 1, -1 + len).
+    '''
+    starts = hits.get(p, {}).get(q, [])
+    if not starts:
+        return [(0, len(p)-1)]
+    if not all_hits:
+        starts = starts[:1]
+    return [ (s+1, s+len(p)) for s in starts ]
+
+
+if __name__ == "__main__":
+	print("It is a library used by SANPRO programs")
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import numpy as np
+
+####################
+# Global variables #
+####################
+
+# average masses of the free amino acids (the same table used by BioPython: Bio.Data.IUPACData.protein_weights)
+PROTEIN_WEIGHTS = {
+    'A': 89.0932, 'C': 121.1582, 'D': 133.1027, 'E': 147.1293, 'F': 165.1891,
+    'G': 75.0666, 'H': 155.1546, 'I': 131.1729, 'K': 146.1876, 'L': 131.1729,
+    'M': 149.2113, 'N': 132.1179, 'O': 255.3134, 'P': 115.1305, 'Q': 146.1445,
+    'R': 174.201, 'S': 105.0926, 'T': 119.1192, 'U': 168.0532, 'V': 117.1463,
+    'W': 204.2252, 'Y': 181.1885
+}
+# average mass of water that is lost in every peptide bond
+WATER = 18.0153
+# ambiguous letters that are removed from the sequence
+AMBIGUOUS = 'XBZ'
+# the masses are summed as integers (in units of 1e-4 Da) so the result does not depend on the summation order
+SCALE = 10000
+
+# lookup tables by residue code (byte value): weight, whether the residue counts in the sequence length,
+# and whether the residue is known (the molecular weight of sequences with unknown letters is NaN).
+LUT_WEIGHT = np.zeros(256, dtype=np.int64)
+LUT_COUNT = np.zeros(256, dtype=np.int64)
+LUT_UNKNOWN = np.ones(256, dtype=np.int64)
+for _aa,_w in PROTEIN_WEIGHTS.items():
+    for _c in (ord(_aa), ord(_aa.lower())):
+        LUT_WEIGHT[_c] = round(_w * SCALE)
+        LUT_COUNT[_c] = 1
+        LUT_UNKNOWN[_c] = 0
+for _aa in AMBIGUOUS:
+    LUT_UNKNOWN[ord(_aa)] = LUT_UNKNOWN[ord(_aa.lower())] = 0
+
+####################
+# Common functions #
+####################
+
+def calculate_molecular_weights(seqs, decimals=2):
+    '''
+    Average molecular weight (Da) of a batch of protein sequences
+
+    Parameters
+    ----------
+    seqs : list of str
+    decimals : int, number of decimals for the rounding
+
+    Returns
+    -------
+    numpy array of floats with the molecular weight of every sequence.
+    '''
+    seqs = list(seqs)
+    if not seqs:
+        return np.empty(0, dtype=np.float64)
+    lens = np.array([len(s) for s in seqs], dtype=np.int64)
+    # convert the sequences into an array of residue codes (with a trailing code for the empty sequences at the end)
+    codes = np.frombuffer((''.join(seqs)+'X').encode('latin-1'), dtype=np.uint8)
+    starts = np.cumsum(lens) - lens
+    # sum the weights, the residues and the unknown letters per sequence
+    sums = np.add.reduceat(LUT_WEIGHT[codes], starts)
+    n = np.add.reduceat(LUT_COUNT[codes], starts)
+    unknown = np.add.reduceat(LUT_UNKNOWN[codes], starts)
+    # reduceat returns the element at the start for the empty sequences
+    empty = lens == 0
+    sums[empty] = n[empty] = unknown[empty] = 0
+    # remove one water per peptide bond
+    mws = (sums - (n - 1) * round(WATER * SCALE)) / SCALE
+    mws[unknown > 0] = np.nan
+    # round as python does (np.round may differ in the last decimal)
+    return np.array([round(x, decimals) for x in mws.tolist()], dtype=np.float64)
+
+if __name__ == "__main__":
+	print("It is a library used by SANPRO programs")
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import sys
+import json
+import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+####################
+# Global variables #
+####################
+
+# key of the schema metadata that keeps the header rows of the iSanXoT tables
+HEADERS_KEY = b'sanpro.headers'
+
+####################
+# Common functions #
+####################
+
+def check_pyarrow():
+    '''
+    The Parquet/Arrow format requires the pyarrow package
+    '''
+    if pa is None:
+        sys.exit("The Parquet output requires the pyarrow package: pip install pyarrow")
+
+def _flat_names(headers):
+    '''
+    Column names in the Arrow table: the first header, or 'first.second' if it is duplicated
+    '''
+    firsts = [h[0] for h in headers]
+    return [ h[0] if firsts.count(h[0]) == 1 else '.'.join(h) for h in headers ]
+
+def from_pandas(df):
+    '''
+    Convert a dataframe with one or two header rows into an Arrow table.
+    The header rows are kept as metadata of the schema (and the second header in the metadata of each field).
+    '''
+    headers = [ tuple(map(str,c)) if isinstance(c, tuple) else (str(c),) for c in df.columns ]
+    names = _flat_names(headers)
+    arrays = [ pa.array(df.iloc[:,i], from_pandas=True) for i in range(df.shape[1]) ]
+    fields = [ pa.field(n, a.type, metadata={b'header': json.dumps(h).encode()}) for n,a,h in zip(names, arrays, headers) ]
+    schema = pa.schema(fields, metadata={HEADERS_KEY: json.dumps(headers).encode()})
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def get_headers(table):
+    '''
+    Header rows of the columns in the Arrow table (list of tuples)
+    '''
+    return [ tuple(h) for h in json.loads(table.schema.metadata[HEADERS_KEY]) ]
+
+def get_column(table, header):
+    '''
+    Column of the Arrow table given by its header tuple
+    '''
+    return table.column(get_headers(table).index(tuple(header)))
+
+def append_column(table, header, values):
+    '''
+    Append a column given by its header tuple into the Arrow table
+    '''
+    headers = get_headers(table) + [tuple(header)]
+    names = _flat_names(headers)
+    field = pa.field(names[-1], values.type, metadata={b'header': json.dumps(header).encode()})
+    table = table.append_column(field, values)
+    # the names of the previous columns may have changed by the duplicates
+    table = table.rename_columns(names)
+    return table.replace_schema_metadata({HEADERS_KEY: json.dumps(headers).encode()})
+
+def read_parquet(ifile):
+    '''
+    Read the Parquet file into a dataframe, restoring the header rows
+    '''
+    table = pq.read_table(ifile)
+    df = table.to_pandas()
+    headers = get_headers(table)
+    if all([len(h) == 2 for h in headers]):
+        df.columns = pd.MultiIndex.from_tuples(headers)
+    return df
+
+
+if __name__ == "__main__":
+	print("It is a library used by SANPRO programs")
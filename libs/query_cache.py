@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import time
+import logging
+import sqlite3
+
+####################
+# Global variables #
+####################
+
+# default maximum number of regions kept in the cache
+MAX_ENTRIES = 1000000
+# maximum number of parameters per SQL statement
+BATCH_SIZE = 500
+
+####################
+# Common functions #
+####################
+
+def open_cache(cache_file, db_key, max_entries=MAX_ENTRIES):
+    '''
+    Open (or create) the persistent cache of query results (SQLite file)
+
+    Parameters
+    ----------
+    cache_file : str, SQLite file
+    db_key : str, key of the database (checksum of the source), so several databases can share the cache file
+    max_entries : int, maximum number of regions in the cache (the least recently used are evicted)
+    '''
+    conn = sqlite3.connect(cache_file, timeout=60)
+    conn.execute("CREATE TABLE IF NOT EXISTS hits (db TEXT NOT NULL, region TEXT NOT NULL, lines TEXT NOT NULL, atime INTEGER NOT NULL, PRIMARY KEY (db, region))")
+    conn.execute("CREATE INDEX IF NOT EXISTS hits_atime ON hits (atime)")
+    conn.commit()
+    return {
+        'conn': conn,
+        'db': db_key,
+        'max_entries': max_entries,
+        'hits': 0,
+        'misses': 0
+    }
+
+def get(cache, regions):
+    '''
+    Results of the regions that are in the cache (dictionary: region -> list of lines).
+    The access time of the found regions is updated.
+    '''
+    conn = cache['conn']
+    out = {}
+    for i in range(0, len(regions), BATCH_SIZE):
+        batch = regions[i:i+BATCH_SIZE]
+        rows = conn.execute(f"SELECT region, lines FROM hits WHERE db = ? AND region IN ({','.join(['?']*len(batch))})", [cache['db'], *batch]).fetchall()
+        for r,lines in rows:
+            out[r] = lines.split('\n') if lines != '' else []
+    if out:
+        atime = time.time_ns()
+        conn.executemany("UPDATE hits SET atime = ? WHERE db = ? AND region = ?", [ (atime, cache['db'], r) for r in out ])
+        conn.commit()
+    cache['hits'] += len(out)
+    cache['misses'] += len(set(regions)) - len(out)
+    return out
+
+def put(cache, results):
+    '''
+    Store the results of the regions (dictionary: region -> list of lines) and evict the least recently used ones
+    '''
+    conn = cache['conn']
+    atime = time.time_ns()
+    conn.executemany("INSERT OR REPLACE INTO hits (db, region, lines, atime) VALUES (?, ?, ?, ?)", [ (cache['db'], r, '\n'.join(lines), atime) for r,lines in results.items() ])
+    (n,) = conn.execute("SELECT COUNT(*) FROM hits").fetchone()
+    if n > cache['max_entries']:
+        conn.execute("DELETE FROM hits WHERE rowid IN (SELECT rowid FROM hits ORDER BY atime LIMIT ?)", (n - cache['max_entries'],))
+    conn.commit()
+
+def close_cache(cache):
+    '''
+    Close the cache and report the hit/miss statistics
+    '''
+    total = cache['hits'] + cache['misses']
+    rate = cache['hits'] / total * 100 if total > 0 else 0
+    logging.info(f"query cache: {cache['hits']} hits, {cache['misses']} misses ({rate:.1f}% hit rate)")
+    cache['conn'].close()
+
+
+if __name__ == "__main__":
+	print("It is a library used by SANPRO programs")
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import os
+import json
+import socket
+import signal
+import logging
+import socketserver
+import http.client
+import http.server
+
+####################
+# Global variables #
+####################
+
+# default host of the TCP services (only local connections)
+HOST = '127.0.0.1'
+# timeout of the client requests (seconds)
+TIMEOUT = 3600
+
+####################
+# Common functions #
+####################
+
+def parse_address(address):
+    '''
+    Address of the service: '[host:]port' for localhost HTTP, otherwise the file of a Unix socket
+
+    Returns a tuple (host, port) or the path of the Unix socket (str).
+    '''
+    host, _, port = str(address).rpartition(':')
+    if port.isdigit():
+        return (host if host else HOST, int(port))
+    return str(address)
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    '''
+    Handler of the JSON requests: the path selects the route, and the body is the JSON payload
+    '''
+    def _reply(self, code, out):
+        body = json.dumps(out).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        route = self.server.routes.get(self.path)
+        if route is None:
+            self._reply(404, {'error': f"Unknown path: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length)) if length > 0 else {}
+            out = route(payload)
+        except Exception as exc:
+            logging.exception(f"the request {self.path} has failed")
+            self._reply(500, {'error': str(exc)})
+            return
+        self._reply(200, out)
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def address_string(self):
+        # the Unix sockets do not have a client address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=TIMEOUT):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def serve(address, routes):
+    '''
+    Serve the routes (dictionary: path -> function(payload) -> dict) over localhost HTTP or a Unix socket
+    until the process is interrupted (SIGINT or SIGTERM)
+    '''
+    addr = parse_address(address)
+    if isinstance(addr, tuple):
+        server = http.server.ThreadingHTTPServer(addr, _Handler)
+    else:
+        if os.path.exists(addr):
+            os.remove(addr)
+        server = _UnixHTTPServer(addr, _Handler)
+    server.routes = routes
+    signal.signal(signal.SIGTERM, _interrupt)
+    logging.info(f"serving on {address}...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("stopping the service...")
+    finally:
+        server.server_close()
+        if not isinstance(addr, tuple) and os.path.exists(addr):
+            os.remove(addr)
+
+def request(address, path, payload=None):
+    '''
+    Send a request to the service and return the JSON reply (dict)
+    '''
+    addr = parse_address(address)
+    conn = http.client.HTTPConnection(*addr, timeout=TIMEOUT) if isinstance(addr, tuple) else _UnixHTTPConnection(addr)
+    try:
+        body = json.dumps(payload if payload is not None else {}).encode('utf-8')
+        conn.request('POST', path, body=body, headers={'Content-Type': 'application/json'})
+        res = conn.getresponse()
+        out = json.loads(res.read())
+    finally:
+        conn.close()
+    if res.status != 200:
+        raise RuntimeError(out.get('error', f"The request {path} has failed ({res.status})"))
+    return out
+
+
+if __name__ == "__main__":
+	print("It is a library used by SANPRO programs")
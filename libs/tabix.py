@@ -0,0 +1,461 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import os
+import gzip
+import zlib
+import mmap
+import struct
+import threading
+import bisect
+import concurrent.futures
+from collections import OrderedDict
+import numpy as np
+
+####################
+# Global variables #
+####################
+
+# maximum number of decompressed BGZF blocks kept in memory (64 KB each at most)
+CACHE_BLOCKS = 1024
+# flag of the tabix format for zero-based coordinates (UCSC/BED)
+TBX_UCSC = 0x10000
+# size of the uncompressed data of every BGZF block (as bgzip)
+BLOCK_SIZE = 0xff00
+# empty BGZF block at the end of the file
+BGZF_EOF = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+# maximum position of the binning scheme (used for the open regions)
+MAX_POS = 1 << 29
+# levels of the binning scheme (shift, offset of the first bin)
+BIN_LEVELS = ((26, 1), (23, 9), (20, 73), (17, 585), (14, 4681))
+
+####################
+# Common functions #
+####################
+
+def read_index(tbi_file):
+    '''
+    Read the tabix index (.tbi) into memory
+
+    Returns
+    -------
+    Dictionary with the format settings, the sequence names (name -> reference id), and the binning
+    index (bin -> array of chunks of virtual offsets) and the linear index of every reference.
+    '''
+    with open(tbi_file, 'rb') as f:
+        buf = gzip.decompress(f.read())
+    if buf[:4] != b'TBI\x01':
+        raise ValueError(f"The file is not a tabix index: {tbi_file}")
+    n_ref, fmt, col_seq, col_beg, col_end, meta, skip, l_nm = struct.unpack_from('<8i', buf, 4)
+    pos = 36
+    names = buf[pos:pos+l_nm].split(b'\x00')[:n_ref]
+    pos += l_nm
+    bins, linear = [], []
+    for _ in range(n_ref):
+        (n_bin,) = struct.unpack_from('<i', buf, pos)
+        pos += 4
+        b = {}
+        for _ in range(n_bin):
+            bin_id, n_chunk = struct.unpack_from('<Ii', buf, pos)
+            pos += 8
+            b[bin_id] = np.frombuffer(buf, dtype='<u8', count=2*n_chunk, offset=pos).reshape(n_chunk, 2)
+            pos += 16*n_chunk
+        (n_intv,) = struct.unpack_from('<i', buf, pos)
+        pos += 4
+        linear.append(np.frombuffer(buf, dtype='<u8', count=n_intv, offset=pos))
+        pos += 8*n_intv
+        bins.append(b)
+    return {
+        'format': fmt,
+        'col_seq': col_seq,
+        'col_beg': col_beg,
+        'col_end': col_end,
+        'meta': chr(meta),
+        'skip': skip,
+        'names': { n.decode('utf-8'): i for i,n in enumerate(names) },
+        'bins': bins,
+        'linear': linear
+    }
+
+def open_tabix(bgzip_file, tbi_file=None, cache_blocks=CACHE_BLOCKS):
+    '''
+    Open the bgzip file (memory-mapped) together with its tabix index.
+    The reader can be shared between threads.
+    '''
+    index = read_index(tbi_file if tbi_file else f"{bgzip_file}.tbi")
+    if index['format'] & 0xFFFF != 0:
+        raise ValueError("Only the generic tabix format (gff, bed) is supported")
+    f = open(bgzip_file, 'rb')
+    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(bgzip_file) > 0 else b''
+    return {
+        'file': f,
+        'mm': mm,
+        'index': index,
+        'cache': OrderedDict(),
+        'cache_blocks': cache_blocks,
+        'lock': threading.Lock()
+    }
+
+def close_tabix(reader):
+    if isinstance(reader['mm'], mmap.mmap):
+        reader['mm'].close()
+    reader['file'].close()
+
+def _decompress_block(mm, coffset):
+    '''
+    Decompress the BGZF block that starts at the given file offset.
+    Returns the decompressed data and the file offset of the next block.
+    '''
+    if mm[coffset:coffset+4] != b'\x1f\x8b\x08\x04':
+        raise ValueError(f"Invalid BGZF block at the offset {coffset}")
+    (xlen,) = struct.unpack_from('<H', mm, coffset+10)
+    # look for the BC subfield with the total block size
+    bsize = None
+    i = coffset + 12
+    while i < coffset + 12 + xlen:
+        si1, si2, slen = struct.unpack_from('<BBH', mm, i)
+        if si1 == 66 and si2 == 67:
+            (bsize,) = struct.unpack_from('<H', mm, i+4)
+        i += 4 + slen
+    if bsize is None:
+        raise ValueError(f"Invalid BGZF block at the offset {coffset}")
+    return zlib.decompress(mm[coffset+12+xlen:coffset+bsize+1-8], -15), coffset+bsize+1
+
+def read_block(reader, coffset):
+    '''
+    Decompress the BGZF block that starts at the given file offset (using the cache of blocks)
+
+    Returns the decompressed data and the file offset of the next block.
+    '''
+    cache = reader['cache']
+    with reader['lock']:
+        if coffset in cache:
+            cache.move_to_end(coffset)
+            return cache[coffset]
+    block = _decompress_block(reader['mm'], coffset)
+    with reader['lock']:
+        cache[coffset] = block
+        if len(cache) > reader['cache_blocks']:
+            cache.popitem(last=False)
+    return block
+
+def read_chunk(reader, vbeg, vend):
+    '''
+    Decompressed data between two virtual offsets
+    '''
+    cbeg, ubeg = vbeg >> 16, vbeg & 0xFFFF
+    cend, uend = vend >> 16, vend & 0xFFFF
+    size = len(reader['mm'])
+    parts = []
+    c = cbeg
+    while c < size and (c < cend or (c == cend and uend > 0)):
+        data, cnext = read_block(reader, c)
+        parts.append(data[(ubeg if c == cbeg else 0):(uend if c == cend else len(data))])
+        c = cnext
+    return b''.join(parts)
+
+def reg2bins(beg, end):
+    '''
+    Bins that may contain records overlapping the 0-based region [beg, end)
+    '''
+    end -= 1
+    bins = [0]
+    for shift,offset in BIN_LEVELS:
+        bins.extend(range(offset + (beg >> shift), offset + (end >> shift) + 1))
+    return bins
+
+def _parse_int(x):
+    return int(float(x.replace(',', '')))
+
+def parse_region(region):
+    '''
+    Parse the region string as tabix does: 'name', 'name:beg' or 'name:beg-end' (1-based, inclusive)
+
+    Returns the name, and the 0-based half-open interval. None if the region is not valid.
+    '''
+    name, sep, pos = region.rpartition(':')
+    if not sep:
+        return region, 0, MAX_POS
+    try:
+        if '-' in pos:
+            beg, end = pos.split('-', 1)
+            beg = _parse_int(beg) if beg != '' else 1
+            end = _parse_int(end) if end != '' else MAX_POS
+        else:
+            beg, end = _parse_int(pos), MAX_POS
+    except ValueError:
+        return None
+    beg = max(beg - 1, 0)
+    if end <= beg:
+        return None
+    return name, beg, end
+
+def get_interval(index, fields):
+    '''
+    0-based half-open interval of the record given by its fields
+    '''
+    beg = int(fields[index['col_beg']-1])
+    if not index['format'] & TBX_UCSC:
+        beg -= 1
+    end = int(fields[index['col_end']-1]) if index['col_end'] > 0 else beg + 1
+    if end <= beg:
+        end = beg + 1
+    return beg, end
+
+def query(reader, region):
+    '''
+    Retrieve the records overlapping the region (as the 'tabix file region' command)
+
+    Returns a list of lines (str, without the newline).
+    '''
+    reg = parse_region(region)
+    index = reader['index']
+    # the region could be just a name that contains ':'
+    if (reg is None or reg[0] not in index['names']) and ':' in region and region in index['names']:
+        reg = (region, 0, MAX_POS)
+    if reg is None or reg[0] not in index['names']:
+        return []
+    name, beg, end = reg
+    tid = index['names'][name]
+    # minimum virtual offset given by the linear index
+    linear = index['linear'][tid]
+    min_off = 0
+    if len(linear) > 0:
+        min_off = int(linear[min(beg >> 14, len(linear)-1)])
+    # collect and merge the chunks of the candidate bins
+    bins = index['bins'][tid]
+    chunks = [ bins[b] for b in reg2bins(beg, end) if b in bins ]
+    if not chunks:
+        return []
+    chunks = np.concatenate(chunks)
+    chunks = chunks[chunks[:,1] > min_off]
+    chunks = chunks[np.argsort(chunks[:,0], kind='stable')].tolist()
+    merged = []
+    for cb,ce in chunks:
+        if merged and cb <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], ce)
+        else:
+            merged.append([cb, ce])
+    # filter the records by the overlap
+    col_seq = index['col_seq'] - 1
+    out = []
+    for cb,ce in merged:
+        for line in read_chunk(reader, cb, ce).decode('utf-8').split('\n'):
+            if line == '' or line.startswith(index['meta']):
+                continue
+            fields = line.rstrip('\r').split('\t')
+            if fields[col_seq] != name:
+                continue
+            rbeg, rend = get_interval(index, fields)
+            # the records are sorted by the start
+            if rbeg >= end:
+                break
+            if rend > beg:
+                out.append(line)
+    return out
+
+def iter_blocks(reader):
+    '''
+    Decompress every BGZF block of the file in order (without the cache of blocks)
+    '''
+    mm = reader['mm']
+    size = len(mm)
+    c = 0
+    while c < size:
+        data, c = _decompress_block(mm, c)
+        yield data
+
+def iter_lines(reader):
+    '''
+    Lines of the bgzip file (bytes, without the newline) decompressing every block once
+    '''
+    rest = b''
+    for data in iter_blocks(reader):
+        lines = (rest + data).split(b'\n')
+        rest = lines.pop()
+        yield from lines
+    if rest:
+        yield rest
+
+def sweep(reader, regions):
+    '''
+    Retrieve the records overlapping every region with a single linear pass over the bgzip file.
+    The regions are sorted by name and start, and they are joined with the records (that are sorted
+    by the start within every sequence) as the file is read.
+
+    Returns
+    -------
+    Dictionary (region -> list of lines), with the same records than query() for every region.
+    '''
+    index = reader['index']
+    out = { r: [] for r in regions }
+    # sort the regions by name and start
+    by_name = {}
+    for r in out:
+        reg = parse_region(r)
+        # the region could be just a name that contains ':' (as query())
+        if (reg is None or reg[0] not in index['names']) and ':' in r and r in index['names']:
+            reg = (r, 0, MAX_POS)
+        if reg is None:
+            continue
+        by_name.setdefault(reg[0], []).append((reg[1], reg[2], r))
+    for name,regs in by_name.items():
+        regs.sort()
+        by_name[name] = {
+            'begs': [ x[0] for x in regs ],
+            'ends': [ x[1] for x in regs ],
+            'hits': [ out[x[2]] for x in regs ],
+            # regions that start before the current record (the next one to add) and that have not ended yet
+            'next': 0,
+            'active': []
+        }
+    if not by_name:
+        return out
+    col_seq = index['col_seq'] - 1
+    n_split = max(index['col_seq'], index['col_beg'], index['col_end'])
+    meta = index['meta'].encode('utf-8')
+    for n,line in enumerate(iter_lines(reader)):
+        if n < index['skip'] or line == b'' or line.startswith(meta):
+            continue
+        fields = line.split(b'\t', n_split)
+        name = fields[col_seq].decode('utf-8')
+        if name not in by_name:
+            continue
+        s = by_name[name]
+        begs, ends, hits = s['begs'], s['ends'], s['hits']
+        rbeg, rend = get_interval(index, fields)
+        # the records are sorted by the start within every sequence: the regions that start before the record
+        # become active, and the active regions that end before the record do not overlap the next records either.
+        # So every region is added and dropped once, even if it is as long as the protein.
+        lo = bisect.bisect_left(begs, rbeg, s['next'])
+        s['active'].extend(range(s['next'], lo))
+        s['next'] = lo
+        s['active'] = [ j for j in s['active'] if ends[j] > rbeg ]
+        # the overlapping regions: the active ones, and those that start within the record
+        hi = bisect.bisect_left(begs, rend, lo)
+        if not s['active'] and lo >= hi:
+            continue
+        line = line.decode('utf-8')
+        for j in s['active']:
+            hits[j].append(line)
+        for j in range(lo, hi):
+            hits[j].append(line)
+    return out
+
+def compress_block(data, level=6):
+    '''
+    Compress the data (up to BLOCK_SIZE bytes) into a BGZF block
+    '''
+    c = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = c.compress(data) + c.flush()
+    header = struct.pack('<4BIBBHBBHH', 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, 18+len(cdata)+8-1)
+    return header + cdata + struct.pack('<II', zlib.crc32(data), len(data))
+
+def write_bgzf(data, ofile, n_threads=1):
+    '''
+    Write the data into a bgzip file compressing the blocks with a pool of threads
+
+    Returns the file offsets of every block (and the offset of the end of the data).
+    '''
+    chunks = [ data[i:i+BLOCK_SIZE] for i in range(0, len(data), BLOCK_SIZE) ]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_threads) as executor:
+        blocks = list(executor.map(compress_block, chunks))
+    with open(ofile, 'wb') as f:
+        for b in blocks:
+            f.write(b)
+        f.write(BGZF_EOF)
+    return np.concatenate(([0], np.cumsum([len(b) for b in blocks]))).astype(np.uint64)
+
+def reg2bin(begs, ends):
+    '''
+    Smallest bin that contains every 0-based region [beg, end) (arrays)
+    '''
+    bins = np.zeros(len(begs), dtype=np.int64)
+    done = np.zeros(len(begs), dtype=bool)
+    for shift,offset in reversed(BIN_LEVELS):
+        m = ~done & ((begs >> shift) == ((ends-1) >> shift))
+        bins[m] = offset + (begs[m] >> shift)
+        done |= m
+    return bins
+
+def build_index(names, tids, begs, ends, vbegs, vends, meta='#'):
+    '''
+    Create the tabix index (generic format with gff columns) of the sorted records
+
+    Parameters
+    ----------
+    names : list of str, sequence names by reference id
+    tids, begs, ends : arrays with the reference id and the 0-based half-open interval of the records
+    vbegs, vends : arrays with the virtual offsets of the start and the end of the records
+
+    Returns the uncompressed content of the .tbi file.
+    '''
+    nm = b''.join([ n.encode('utf-8')+b'\x00' for n in names ])
+    out = [struct.pack('<4s8i', b'TBI\x01', len(names), 0, 1, 4, 5, ord(meta), 0, len(nm)), nm]
+    bins = reg2bin(begs, ends)
+    tid_offsets = np.searchsorted(tids, np.arange(len(names)+1), side='left')
+    for t in range(len(names)):
+        lo, hi = tid_offsets[t], tid_offsets[t+1]
+        tb, tvb, tve = bins[lo:hi], vbegs[lo:hi], vends[lo:hi]
+        # chunks of contiguous records of the same bin
+        order = np.argsort(tb, kind='stable')
+        sb, svb, sve = tb[order], tvb[order], tve[order]
+        new = np.ones(len(sb), dtype=bool)
+        new[1:] = (sb[1:] != sb[:-1]) | (svb[1:] != sve[:-1])
+        starts = np.flatnonzero(new)
+        cbins = sb[starts]
+        chunks = np.stack((svb[starts], sve[np.append(starts[1:], len(sb)) - 1]), axis=1).astype('<u8')
+        ubins, bstarts, bcounts = np.unique(cbins, return_index=True, return_counts=True)
+        out.append(struct.pack('<i', len(ubins)))
+        for b,s,c in zip(ubins.tolist(), bstarts.tolist(), bcounts.tolist()):
+            out.append(struct.pack('<Ii', b, c))
+            out.append(chunks[s:s+c].tobytes())
+        # linear index: the first record that overlaps every window of 16 kb
+        wbeg = begs[lo:hi] >> 14
+        wend = (ends[lo:hi]-1) >> 14
+        n_intv = int(wend.max()) + 1 if hi > lo else 0
+        linear = np.zeros(n_intv, dtype=np.uint64)
+        counts = wend - wbeg + 1
+        rec = np.repeat(np.arange(hi-lo), counts)
+        win = wbeg[rec] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        first = np.full(n_intv, np.iinfo(np.uint64).max, dtype=np.uint64)
+        np.minimum.at(first, win, tvb[rec])
+        linear[first != np.iinfo(np.uint64).max] = first[first != np.iinfo(np.uint64).max]
+        # the empty windows take the offset of the previous one
+        idx = np.maximum.accumulate(np.where(linear > 0, np.arange(n_intv), 0))
+        linear = linear[idx] if n_intv > 0 else linear
+        out.append(struct.pack('<i', n_intv))
+        out.append(linear.astype('<u8').tobytes())
+    return b''.join(out)
+
+def write_tabix(ofile, header, names, tids, begs, ends, lines, n_threads=1):
+    '''
+    Write the sorted records into a bgzip file, together with its tabix index (ofile.tbi)
+
+    Parameters
+    ----------
+    ofile : str, bgzip file
+    header : list of bytes, header lines (not indexed)
+    names : list of str, sequence names by reference id
+    tids, begs, ends : arrays with the reference id and the 0-based half-open interval of the records
+        (sorted by reference id and start)
+    lines : list of bytes, lines of the records (without the newline)
+    n_threads : int, number of threads for the compression
+    '''
+    head = b''.join([ h+b'\n' for h in header ])
+    data = head + b''.join([ l+b'\n' for l in lines ])
+    coffsets = write_bgzf(data, f"{ofile}.tmp", n_threads)
+    # virtual offsets of the start and end of every record
+    ubegs = len(head) + np.concatenate(([0], np.cumsum([len(l)+1 for l in lines]))).astype(np.int64)
+    voffs = (coffsets[ubegs // BLOCK_SIZE] << np.uint64(16)) | (ubegs % BLOCK_SIZE).astype(np.uint64)
+    tbi = build_index(names, tids, begs, ends, voffs[:-1], voffs[1:])
+    write_bgzf(tbi, f"{ofile}.tbi.tmp")
+    os.replace(f"{ofile}.tmp", ofile)
+    os.replace(f"{ofile}.tbi.tmp", f"{ofile}.tbi")
+
+
+if __name__ == "__main__":
+	print("It is a library used by SANPRO programs")
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import re
+import operator
+import numpy as np
+import pandas as pd
+
+####################
+# Global variables #
+####################
+
+# tokens of the filter syntax: [column], 'text', number, operators, parentheses and keywords
+TOKEN_RE = re.compile(r'''\s*(?:
+    (?P<col>\[[^\]]*\])|
+    (?P<str>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")|
+    (?P<num>-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)|
+    (?P<op>==|!=|<=|>=|<|>|&|\||~|\(|\))|
+    (?P<word>[A-Za-z_]\w*)
+    )''', re.VERBOSE)
+# comparison operators
+CMP_OPS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge
+}
+# keywords equivalent to the logical operators
+KEYWORDS = {'and': '&', 'or': '|', 'not': '~'}
+# boolean literals
+BOOLS = {'True': True, 'False': False}
+
+####################
+# Common functions #
+####################
+
+def _tokenize(flt):
+    '''
+    Split the filter into tokens (type, value)
+    '''
+    tokens = []
+    pos = 0
+    flt = flt.rstrip()
+    while pos < len(flt):
+        m = TOKEN_RE.match(flt, pos)
+        if m is None or m.end() == pos:
+            raise ValueError(f"Invalid syntax at the position {pos} of the filter: {flt}")
+        pos = m.end()
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == 'col':
+            tokens.append(('col', value[1:-1]))
+        elif kind == 'str':
+            tokens.append(('lit', re.sub(r'\\(.)', r'\1', value[1:-1])))
+        elif kind == 'num':
+            tokens.append(('lit', float(value)))
+        elif kind == 'word' and value in KEYWORDS:
+            tokens.append(('op', KEYWORDS[value]))
+        elif kind == 'word' and value in BOOLS:
+            tokens.append(('lit', BOOLS[value]))
+        elif kind == 'word':
+            raise ValueError(f"Unknown word '{value}' in the filter: {flt}")
+        else:
+            tokens.append(('op', value))
+    return tokens
+
+class _Parser:
+    '''
+    Recursive descent parser of the filter syntax:
+
+        expr    := and ('|' and)*
+        and     := not ('&' not)*
+        not     := '~' not | '(' expr ')' | compare
+        compare := operand (('==' | '!=' | '<' | '<=' | '>' | '>=') operand)?
+        operand := [column] | 'text' | number | True | False
+    '''
+    def __init__(self, flt):
+        self.flt = flt
+        self.tokens = _tokenize(flt)
+        self.pos = 0
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def _next(self):
+        tok = self._peek()
+        self.pos += 1
+        return tok
+
+    def _error(self, sms):
+        raise ValueError(f"{sms} in the filter: {self.flt}")
+
+    def parse(self):
+        node = self._expr()
+        if self.pos < len(self.tokens):
+            self._error(f"Unexpected '{self._peek()[1]}'")
+        return node
+
+    def _expr(self):
+        node = self._and()
+        while self._peek() == ('op', '|'):
+            self._next()
+            node = ('or', node, self._and())
+        return node
+
+    def _and(self):
+        node = self._not()
+        while self._peek() == ('op', '&'):
+            self._next()
+            node = ('and', node, self._not())
+        return node
+
+    def _not(self):
+        tok = self._peek()
+        if tok == ('op', '~'):
+            self._next()
+            return ('not', self._not())
+        if tok == ('op', '('):
+            self._next()
+            node = self._expr()
+            if self._next() != ('op', ')'):
+                self._error("Missing ')'")
+            return node
+        return self._compare()
+
+    def _compare(self):
+        left = self._operand()
+        kind, value = self._peek()
+        if kind == 'op' and value in CMP_OPS:
+            self._next()
+            return ('cmp', value, left, self._operand())
+        if left[0] == 'lit' and isinstance(left[1], bool):
+            return left
+        self._error(f"Missing the comparison operator after {left[1]!r}")
+
+    def _operand(self):
+        kind, value = self._next()
+        if kind not in ('col', 'lit'):
+            self._error(f"Unexpected '{value}'" if kind else "Unexpected end")
+        return (kind, value)
+
+def _map_cols(node, parse_col):
+    if node[0] == 'col':
+        return ('col', parse_col(node[1]))
+    if node[0] == 'cmp':
+        return ('cmp', node[1], _map_cols(node[2], parse_col), _map_cols(node[3], parse_col))
+    if node[0] in ('or', 'and', 'not'):
+        return (node[0], *[ _map_cols(n, parse_col) for n in node[1:] ])
+    return node
+
+def compile_filter(flt, parse_col=None):
+    '''
+    Compile the boolean expression into a plan of vectorized operations
+
+    Parameters
+    ----------
+    flt : str, boolean expression
+        Example: ([FDR] < 0.05) & ([n] >= 10) & ([n] <= 100)
+    parse_col : function that converts the text of the columns into their labels (e.g. tuples with two headers)
+
+    Returns
+    -------
+    Dictionary with the expression, the plan (tree of tuples), the columns used by the filter and the columns
+    compared with other columns (their type has to be known for the whole table, see apply_filter).
+    '''
+    plan = _Parser(flt).parse()
+    if parse_col is not None:
+        plan = _map_cols(plan, parse_col)
+    cols, pair_cols = [], []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if node[0] == 'col':
+            if node[1] not in cols:
+                cols.append(node[1])
+        elif node[0] in ('or', 'and', 'not'):
+            stack.extend(node[1:])
+        elif node[0] == 'cmp':
+            stack.extend(node[2:])
+            if node[2][0] == 'col' and node[3][0] == 'col':
+                pair_cols += [ x[1] for x in node[2:] if x[1] not in pair_cols ]
+    return {'filter': flt, 'plan': plan, 'columns': cols, 'pair_columns': pair_cols}
+
+def _is_numeric(s):
+    return bool(pd.to_numeric(s.dropna(), errors='coerce').notna().all())
+
+def _compare(op, left, right, df, numeric_cols):
+    '''
+    Compare the operands: as numbers against a number or between numeric columns, otherwise as text.
+    The missing values are only different from anything.
+    '''
+    n = len(df)
+    f = CMP_OPS[op]
+    if left[0] == 'lit' and right[0] == 'lit':
+        return np.full(n, bool(f(left[1], right[1])))
+    vals = [ df[x[1]] if x[0] == 'col' else x[1] for x in (left, right) ]
+    if any([ isinstance(v, str) for v in vals ]):
+        numeric = False
+    elif any([ isinstance(v, (bool, float)) for v in vals ]):
+        numeric = True
+    elif numeric_cols is not None:
+        numeric = all([ numeric_cols[x[1]] for x in (left, right) ])
+    else:
+        numeric = all([ _is_numeric(v) for v in vals ])
+    na = np.zeros(n, dtype=bool)
+    for v in vals:
+        if isinstance(v, pd.Series):
+            na |= v.isna().to_numpy()
+    if numeric:
+        vals = [ pd.to_numeric(v, errors='coerce').to_numpy(dtype=float) if isinstance(v, pd.Series) else float(v) for v in vals ]
+        for v in vals:
+            if isinstance(v, np.ndarray):
+                na |= np.isnan(v)
+    else:
+        vals = [ v.to_numpy(dtype=object).astype(str) if isinstance(v, pd.Series) else str(v) for v in vals ]
+    out = np.full(n, op == '!=')
+    out[~na] = f(*[ v[~na] if isinstance(v, np.ndarray) else v for v in vals ])
+    return out
+
+def _eval(node, df, numeric_cols):
+    kind = node[0]
+    if kind == 'or':
+        return _eval(node[1], df, numeric_cols) | _eval(node[2], df, numeric_cols)
+    if kind == 'and':
+        return _eval(node[1], df, numeric_cols) & _eval(node[2], df, numeric_cols)
+    if kind == 'not':
+        return ~_eval(node[1], df, numeric_cols)
+    if kind == 'cmp':
+        return _compare(node[1], node[2], node[3], df, numeric_cols)
+    return np.full(len(df), bool(node[1]))
+
+def apply_filter(flt, df, numeric_cols=None):
+    '''
+    Boolean mask (numpy array) of the rows of the dataframe that fulfil the compiled filter
+
+    Parameters
+    ----------
+    flt : dictionary, compiled filter
+    df : pandas dataframe (values as text)
+    numeric_cols : dictionary (column -> bool), the columns that are numeric in the whole table. They decide
+        how the columns compared with other columns are compared (as numbers or text), so every chunk of the
+        table gets the same result. By default, they are checked within the given dataframe.
+    '''
+    return _eval(flt['plan'], df, numeric_cols)
+
+
+if __name__ == "__main__":
+	print("It is a library used by SANPRO programs")
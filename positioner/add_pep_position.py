@@ -4,14 +4,25 @@
 """
 
 # import global modules
+import os
 import sys
 import argparse
 import logging
-from string import digits, ascii_letters
+import re
+import csv
+import concurrent.futures
+from functools import lru_cache
+import numpy as np
 import pandas as pd
-from pyfaidx import Fasta
-from Bio.SeqUtils.ProtParam import ProteinAnalysis
 
+#########################
+# Import local packages #
+#########################
+sys.path.append(f"{os.path.dirname(__file__)}/../libs")
+import locator
+import fasta_meta
+import molweight
+import parquet_io
 
 
 ###################
@@ -35,64 +46,68 @@ parser.add_argument('-f',   required=True, help='Protein sequences in FASTA form
 parser.add_argument('-hp',  required=True, help='Column header of peptide level')
 parser.add_argument('-hq',  required=True, help='Column header of protein level')
 parser.add_argument('-o',   required=True, help='Output file that is the Report file with the peptide positions')
+parser.add_argument('-ft',  choices=['tsv','parquet'], default='tsv', help='Format of the output file. The Parquet format stores the results as typed list columns (default: %(default)s)')
+parser.add_argument('-od',  help='Output file with the per-residue peptide depth of every protein (optional)')
+parser.add_argument('-w',   type=int, default=1, help='Number of processes/n_workers (default: %(default)s)')
+mode = parser.add_mutually_exclusive_group()
+mode.add_argument('-n',   type=int, help='Number of rows per chunk. If given, the report is processed in chunks with bounded memory')
+mode.add_argument('-s',   action='store_true', help='Read only the peptide and protein columns, and append the result columns to the original lines without parsing the others')
+parser.add_argument('-a',   action='store_true', help='Report all the occurrences of the peptide within the protein (separated by commas), not only the first one')
 args = parser.parse_args()
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%m/%d/%Y %I:%M:%S %p')
 
 
-###################
-# Local functions #
-###################
-
-# Union of multiple ranges from a list of tuples
-# return a list of list (two elements: [start,end])
-def union_ranges(a):
-    b = []
-    for begin,end in sorted(a):
-        if b and b[-1][1] >= begin - 1:
-            b[-1][1] = max(b[-1][1], end)
-        else:
-            b.append([begin, end])
-    return b
-
-# Function that obtain the molecular weight from a protein sequence using BioPython
-def calculate_molecular_weight(s):    
-    # remove unambigous letter
-    s = s.replace('X','').replace('B','').replace('Z','')
-    X = ProteinAnalysis(s)
-    return round(X.molecular_weight(),2)
+#############
+# Constants #
+#############
 
-
-#################
-# Main function #
-#################
-def main(args):
-    '''
-    Main function
-    '''    
-    logging.info("getting the input parameters...")
-    ifile1 = args.i
-    ifile2 = args.f
-    hp  = args.hp
-    hq  = args.hq
-    ofile = args.o
-    # ifile1 = r"S:\U_Proteomica\UNIDAD\Softwares\jmrodriguezc\SANPRO\tests\test4\Npep2prot.tsv"
-    # ifile2 = r"S:\U_Proteomica\UNIDAD\Softwares\jmrodriguezc\SANPRO\tests\test4\mouse_202206_uni-sw-tr.target.fasta"
-    # hp  = 'peptide'
-    # hq  = 'protein'
-    # ofile = r"S:\U_Proteomica\UNIDAD\Softwares\jmrodriguezc\SANPRO\tests\test4\Npep2prot.new2.tsv"
-    
+# modifications that are not reported (isobaric labeling and carbamidomethylation)
+MOD_EXCLUDED = re.compile(r'itraq|tmt|carbamidomethyl', re.IGNORECASE)
+# tokenizer of one modification: residue, position and delta mass (or name) within the parenthesis
+# Example: M1(Oxidation), S2(+79.966331)
+MOD_TOKEN = re.compile(r'[^A-Za-z(]*([A-Za-z])([^(]*)(?:\(([^)]*))?')
+MOD_DIGITS = re.compile(r'[0-9]+')
 
 
-    logging.info("reading report file...")
-    # Two headers:
-    report = pd.read_csv(ifile1, sep="\t", header=[0,1], na_values=['NA', 'excluded'], low_memory=False) # two header rows
-    # # One header:
-    # report = pd.read_csv(ifile1, sep="\t", na_values=['NA', 'excluded'], low_memory=False)
 
+###################
+# Local functions #
+###################
 
+# Parse the modification string (the suffix of the peptide after '__') into a tuple of (residue, position, delta mass).
+# The isobaric labeling and carbamidomethylation are removed, as well as the modifications without position.
+# The result is cached because the number of distinct modification strings is small.
+@lru_cache(maxsize=None)
+def parse_mods(text):
+    mods = []
+    for s in text.split(';'):
+        s = s.strip()
+        if MOD_EXCLUDED.search(s):
+            continue
+        t = MOD_TOKEN.match(s)
+        if t is None:
+            continue
+        # the position contains the digits between the residue and the parenthesis
+        pos = ''.join(MOD_DIGITS.findall(t.group(2)))
+        if not pos:
+            continue
+        # the delta mass, if the parenthesis has a number
+        try:
+            mass = float(t.group(3))
+        except (TypeError, ValueError):
+            mass = None
+        mods.append((t.group(1), int(pos), mass))
+    return tuple(mods)
+
+def parse_report(report, hp, hq):
+    '''
+    Extract the raw peptide, the list of proteins and the modifications from the report
 
-    logging.info("parsing the report file...")
+    Returns
+    -------
+    Dataframe with the unique (peptide, protein) keys, and the integer code of the key for each row.
+    '''
     # Two headers:
     # Filter by levels
     rep = report[[(hp,'LEVEL'),(hq,'LEVEL')]]
@@ -105,157 +120,173 @@ def main(args):
     
     # reset
     rep = rep.reset_index(drop=True)
+    rep[hp] = rep[hp].fillna('')
     rep[hq] = rep[hq].fillna('')
     
+    # factorize the rows into unique (peptide, protein) keys. Everything is computed once per key
+    codes = rep.groupby([hp,hq], sort=False).ngroup().to_numpy()
+    rep = rep.drop_duplicates([hp,hq]).reset_index(drop=True)
     
-    
-    logging.info("extracting the raw peptide...")
     # Extract the raw peptide containing the delta-mass, if applicable.
-    split_pep = rep[hp].str.split('__')
+    split_pep = rep[hp].str.split('__', n=1)
     p = [i[0] for i in split_pep]
-    m = [i[1] for i in split_pep]
+    m = [i[1] if len(i) > 1 else '' for i in split_pep]
     rep[f"{hp}_raw"] = p
     # if the columns has ';' separator, then split the multiple proteins in a list an create one column.
     q = rep[hq].str.split(r"\s*;\s*", regex=True)
     rep[f"{hq}_raw"] = q
     
-    
-    
-    logging.info("extracting the modification...")
     # get the modifications
     rep[f"{hp}_mods"] = m
-    # remove isobaric labeling
-    def remove_tmt_itraq(text):
-        parts = [p.strip() for p in text.split(';')]
-        filtered = [ p for p in parts if 'itraq' not in p.lower() and 'tmt' not in p.lower() and 'carbamidomethyl' not in p.lower() ]
-        return ';'.join(filtered)
-    m_f = [remove_tmt_itraq(t) for t in m]
-    rep[f"{hp}_mods"] = m_f
-    # obtain a list of modification position
-    def get_mod_position(s: str):
-        mod = None
-        pos_str = []
-        for ch in s:
-            if mod is None and ch in ascii_letters:
-                mod = ch
-            elif mod and ch in digits:
-                pos_str.append(ch)
-            elif ch == '(':
-                break
-        if not pos_str:
-            return (mod, None)
-        pos = int(''.join(pos_str))
-        return (mod, pos)    
-    m_p = [ [ get_mod_position(s) for s in m.split(';') ] if m != '' else [] for m in m_f ]
-    rep[f"{hp}_mod_pos"] = m_p
-
-
-
-    logging.info("extracting the unique protein list...")
-    proteins = rep[f"{hq}_raw"].explode().drop_duplicates().tolist()
-
-
+    # parse the distinct modification strings once and map them back through their codes
+    # obtain a list of (residue, position, delta mass) without the isobaric labeling
+    m_c, m_u = pd.factorize(pd.Series(m, dtype=object))
+    m_u = [parse_mods(t) for t in m_u]
+    rep[f"{hp}_mod_pos"] = [m_u[c] for c in m_c]
+    return rep, codes
+
+def read_fasta_proteins(meta, proteins):
+    '''
+    Get the metadata, the length and the molecular weight of the given proteins from the FASTA file
+    '''
+    # filter by the given list
+    meta_flt = fasta_meta.filter_meta(meta, proteins)
+    # get the length of protein seq from the fasta
+    seqlen = dict([(q.decode('utf-8'),int(l)) for q,l in zip(meta_flt['acc'],meta_flt['length'])])
+    # get the molecular weight (Da)
+    seqmw = dict([(q.decode('utf-8'),float(w)) for q,w in zip(meta_flt['acc'],meta_flt['mw'])])
+    return meta_flt, seqlen, seqmw
+
+def locate_peptides(ifile, meta, rep, hp, hq, executor=None, n_workers=1):
+    '''
+    Find all the occurrences of every unique peptide within the proteins in use.
+    With several workers, the proteins and their peptides are sharded across the process pool.
+    '''
+    if executor is None or n_workers <= 1:
+        # index the sequences in use and find all the occurrences of every unique peptide in one pass
+        return locator.locate_peptides_in_fasta(ifile, meta, rep[f"{hp}_raw"].drop_duplicates())
+    pairs = [ (p,q) for p,r in zip(rep[f"{hp}_raw"],rep[f"{hq}_raw"]) for q in r ]
+    return locator.locate_peptides_sharded(ifile, meta, pairs, executor, n_workers)
 
-    logging.info("reading fasta file filtering by the given proteins...")
-    # get the protein id as key and filtering by the given list
-    fasta_ite = Fasta(ifile2, key_function = lambda x: x.split('|')[1] if len(x.split('|')) > 1 else x.split('|')[0], filt_function = lambda x: x in proteins)
+def add_positions(rep, hp, hq, peptide_hits, fasta_proteins_seqlen, fasta_proteins_seqmw, all_hits=False):
+    '''
+    Add the sequence information, the peptide positions and the modification positions for the list of proteins
+    '''
     # get the proteins from the fasta
-    fasta_proteins = fasta_ite.keys()
-    # get the protein seq from the fasta
-    fasta_proteins_seq = dict([(q,fasta_ite[q][:].seq) for q in fasta_proteins])
-    # get the protein seq from the fasta
-    fasta_proteins_seqlen = dict([(q,len(s)) for q,s in fasta_proteins_seq.items()])
-    # calculate the molecular weight (Da)
-    fasta_proteins_seqmw = dict([(q,calculate_molecular_weight(s)) for q,s in fasta_proteins_seq.items()])
-    
-    
-
-    logging.info("getting the sequences for the list of proteins...")
-    # add the sequences
-    rep[f"{hq}_seqs"] = [ [fasta_proteins_seq[q] for q in r if q in fasta_proteins] if isinstance(r, list) else [''] for r in rep[f"{hq}_raw"] ]
+    fasta_proteins = fasta_proteins_seqlen.keys()
     # add the length of sequences
     rep[f"{hq}_seqlen"] = [ [fasta_proteins_seqlen[q] for q in r if q in fasta_proteins] if isinstance(r, list) else [0] for r in rep[f"{hq}_raw"] ]
     # add the molecular weight
     rep[f"{hq}_seqmw"] = [ [fasta_proteins_seqmw[q] for q in r if q in fasta_proteins] if isinstance(r, list) else [0] for r in rep[f"{hq}_raw"] ]
 
-    
-    
-    logging.info("getting the sequence position for the protein list...")
+    # get the found proteins for each row
+    rep[f"{hq}_found"] = [ [q for q in r if q in fasta_proteins] if isinstance(r, list) else [''] for r in rep[f"{hq}_raw"] ]
+
     # get a list of tuple with the peptide and the list of proteins
-    ps = list(zip(rep[f"{hp}_raw"],rep[f"{hq}_seqs"]))
-    # add the start/end index of peptide
-    peptide_pos = [ [ (s.find(r[0])+1,s.find(r[0])+len(r[0])) if s != '' else [(0,0)] for s in r[1] ] for r in ps ]
+    ps = list(zip(rep[f"{hp}_raw"],rep[f"{hq}_found"]))
+    # add the start/end index of peptide (the first occurrence)
+    peptide_pos = [ [ locator.get_peptide_pos(peptide_hits, r[0], q)[0] if fasta_proteins_seqlen.get(q, 0) > 0 else [(0,0)] for q in r[1] ] for r in ps ]
     rep[f"{hp}_pos"] = peptide_pos
-    
-    
-    
-    logging.info("getting the modification positions for the protein list...")
+    # add all the occurrences of peptide, if applicable
+    if all_hits:
+        rep[f"{hp}_allpos"] = [ [ locator.get_peptide_pos(peptide_hits, r[0], q, all_hits=True) if fasta_proteins_seqlen.get(q, 0) > 0 else [(0,0)] for q in r[1] ] for r in ps ]
+
     # get a list of tuple with the modification and the list of peptide positions
     mp = list(zip(rep[f"{hp}_mod_pos"],rep[f"{hp}_pos"]))
     # sum the mod position to the start peptide    
-    modification_pos = [ [ (x[0],y[0]+x[1]-1) for y in m[1] for x in m[0] if len(m[0]) > 0 and x[1] is not None ] for m in mp]
+    modification_pos = [ [ (x[0],y[0]+x[1]-1,x[2]) for y in m[1] for x in m[0] ] for m in mp]
     rep["modification_pos"] = modification_pos
-    
-    
-    
-    logging.info("getting the modification positions ...")
-    # Extract the modifications ptide containing the delta-mass, if applicable.
-    rep[hp] = rep[hp].fillna('')
-    split_pep = rep[hp].str.split('__')
-    p = [i[0] for i in split_pep]
-    m = [i[1] for i in split_pep]
-    rep[f"{hp}_raw"] = p
-    # if the columns has ';' separator, then split the multiple proteins in a list an create one column.
-    rep[hq] = rep[hq].fillna('')
-    q = rep[hq].str.split(r"\s*;\s*", regex=True)
-    rep[f"{hq}_raw"] = q
-
+    return rep
 
-    # get a list of tuple with the peptide and the list of proteins
-    ps = list(zip(rep[f"{hp}_raw"],rep[f"{hq}_seqs"]))
-    # add the start/end index of peptide
-    peptide_pos = [ [ (s.find(r[0])+1,s.find(r[0])+len(r[0])) if s != '' else [(0,0)] for s in r[1] ] for r in ps ]
-    rep[f"{hp}_pos"] = peptide_pos
+def get_pep_ranges(rep, hp, hq, protein_pep_pos=None):
+    '''
+    Distinct peptide ranges (start, end) per protein. If a previous summary is given, the ranges are added into it
+    '''
+    protein_pep_pos = {} if protein_pep_pos is None else protein_pep_pos
+    # merge the found proteins with their peptide positions
+    for qs,pps in zip(rep[f"{hq}_found"],rep[f"{hp}_pos"]):
+        for q,pp in zip(qs,pps):
+            if isinstance(pp, tuple):
+                protein_pep_pos.setdefault(q, set()).add(pp)
+    return protein_pep_pos
+
+def get_depth(protein_pep_pos, fasta_proteins_seqlen, found_only=False):
+    '''
+    Per-residue peptide depth of every protein using a difference array with a cumulative sum.
+    If found_only is given, the ranges of the not found peptides (that start at 0) are skipped.
 
+    Returns
+    -------
+    Dictionary (protein id -> array with the number of peptides that cover each position, where the index is the 1-based position).
+    '''
+    ids = list(protein_pep_pos.keys())
+    if not ids:
+        return {}
+    # start/end arrays of all the proteins, with the index of the protein
+    pp = [np.array(sorted([r for r in protein_pep_pos[q] if not found_only or r[0] > 0]), dtype=np.int64).reshape(-1,2) for q in ids]
+    idx = np.repeat(np.arange(len(ids)), [len(x) for x in pp])
+    pp = np.concatenate(pp)
+    # one segment per protein that contains all its positions (the not found peptides start at 0)
+    ends = np.zeros(len(ids), dtype=np.int64)
+    np.maximum.at(ends, idx, pp[:,1])
+    sizes = np.maximum(np.array([fasta_proteins_seqlen.get(q, 0) for q in ids], dtype=np.int64), ends) + 2
+    offsets = np.cumsum(sizes) - sizes
+    # +1 at the start and -1 after the end of every peptide. The sum of each segment is zero, so the cumsum does not overflow into the next protein
+    diff = np.zeros(sizes.sum(), dtype=np.int64)
+    np.add.at(diff, offsets[idx] + pp[:,0], 1)
+    np.add.at(diff, offsets[idx] + pp[:,1] + 1, -1)
+    depth = np.cumsum(diff)
+    return dict([(q,depth[o:o+n]) for q,o,n in zip(ids, offsets, sizes)])
+
+def get_coverage(proteins_raw, protein_depth, fasta_proteins_seqlen):
+    '''
+    Coverage of every protein in the report from the per-residue peptide depth
+    '''
+    # count the number of aa covered by peptides
+    protein_pep_count = dict([(q,int(np.count_nonzero(d))) for q,d in protein_depth.items()])
+    # for each protein in the report, add the coverage
+    protein_coverage = [ [round(protein_pep_count[q]/fasta_proteins_seqlen[q],2) for q in r if q in protein_pep_count and q in fasta_proteins_seqlen] for r in proteins_raw ]
+    return protein_coverage
 
+def write_depth(ofile, protein_depth, fasta_proteins_seqlen):
+    '''
+    Print the per-residue peptide depth of every protein (separated by semicolons)
+    '''
+    with open(ofile, 'w') as f:
+        f.write("protein\tprotein_seqlen\tpeptide_depth\n")
+        for q in sorted(protein_depth):
+            n = fasta_proteins_seqlen.get(q, 0)
+            f.write(f"{q}\t{n}\t{';'.join(map(str,protein_depth[q][1:n+1].tolist()))}\n")
 
-    logging.info("getting the protein coverage...")
-    # get a list of tuple with the protein and peptide positions
-    qp = list(zip(rep[f"{hq}_raw"],rep[f"{hp}_pos"]))
-    # merge the proteins with their peptide positions (merge two list into list of tuples)
-    qpp = [list(zip(x,y)) for (x, y) in qp]
-    # create protein dictionary (merge list of tuples based on the first element (protein_id))
-    protein_pep_pos = {}
-    for rr in qpp:
-        for q,pp in rr:
-            if q in protein_pep_pos:
-                protein_pep_pos[q].append(pp)
-            else:
-                protein_pep_pos[q] = [pp]
-    # get the union of ranges
-    protein_pep_pos = dict([(q,union_ranges(pp)) for q,pp in protein_pep_pos.items()])    
-    # count the number of aa per peptide range
-    protein_pep_count = dict([(q,sum([p[1]-p[0]+1 for p in pp])) for q,pp in protein_pep_pos.items()])
-    # for each protein in the report, add the coverage
-    protein_coverage = [ [round(protein_pep_count[q]/fasta_proteins_seqlen[q],2) for q in r if q in protein_pep_count and q in fasta_proteins_seqlen] for r in rep[f"{hq}_raw"] ]
-    rep[f"{hq}_coverage"] = protein_coverage
-        
-    
+def broadcast(values, codes):
+    '''
+    Map the values computed per unique key back to the rows through their integer codes
+    '''
+    return np.array(values, dtype=object)[codes]
 
-    logging.info("adding the result columns into report...")
+def add_results(report, rep, codes, hp, hq, all_hits=False):
+    '''
+    Add the result columns into report. The strings are built once per unique key
+    '''
     # Two headers:
     # join the int tuples into string (remembering that the int tuple is converting to str tuple)
-    report[('peptide_raw','STATS')] = [p for p in rep[f"{hp}_raw"]]
+    report[('peptide_raw','STATS')] = broadcast([p for p in rep[f"{hp}_raw"]], codes)
     # join the int tuples into string (remembering that the int tuple is converting to str tuple)
-    report[('peptide_pos','STATS')] = [';'.join(['-'.join(map(str,i)) for i in p]) for p in rep[f"{hp}_pos"]]
+    if all_hits:
+        report[('peptide_pos','STATS')] = broadcast([';'.join([','.join(['-'.join(map(str,j)) for j in i]) for i in p]) for p in rep[f"{hp}_allpos"]], codes)
+    else:
+        report[('peptide_pos','STATS')] = broadcast([';'.join(['-'.join(map(str,i)) for i in p]) for p in rep[f"{hp}_pos"]], codes)
     # join the int tuples into string (remembering that the int tuple is converting to str tuple)
-    report[('modification_pos','STATS')] = [';'.join([''.join(map(str,i)) for i in p]) for p in rep["modification_pos"]]
+    report[('modification_pos','STATS')] = broadcast([';'.join([f"{i[0]}{i[1]}" for i in p]) for p in rep["modification_pos"]], codes)
+    # add the delta mass of modifications (empty if the modification has not mass)
+    report[('modification_mass','STATS')] = broadcast([';'.join(['' if i[2] is None else str(i[2]) for i in p]) for p in rep["modification_pos"]], codes)
     # add the length of protein sequences
-    report[('protein_seqlen','STATS')] = [';'.join(map(str,p)) for p in rep[f"{hq}_seqlen"]]
+    report[('protein_seqlen','STATS')] = broadcast([';'.join(map(str,p)) for p in rep[f"{hq}_seqlen"]], codes)
     # add the molecular weight in daltons
-    report[('protein_seqmw','STATS')] = [';'.join(map(str,p)) for p in rep[f"{hq}_seqmw"]]
+    report[('protein_seqmw','STATS')] = broadcast([';'.join(map(str,p)) for p in rep[f"{hq}_seqmw"]], codes)
     # add the protein coverage
-    report[('protein_coverage','STATS')] = [';'.join(map(str,p)) for p in rep[f"{hq}_coverage"]]
+    if f"{hq}_coverage" in rep.columns:
+        report[('protein_coverage','STATS')] = broadcast([';'.join(map(str,p)) for p in rep[f"{hq}_coverage"]], codes)
 
     # # One header:
     # # join the int tuples into string (remembering that the int tuple is converting to str tuple)
@@ -266,11 +297,263 @@ def main(args):
     # report['protein_seqmw'] = [';'.join(map(str,p)) for p in rep[f"{hq}_seqmw"]]
     # # add the protein coverage
     # report['protein_coverage'] = [';'.join(map(str,p)) for p in rep[f"{hq}_coverage"]]
+    return report
+
+def add_results_arrow(table, rep, codes, hp, hq, all_hits=False):
+    '''
+    Add the result columns into the Arrow table as typed list columns. The arrays are built once per unique key
+    '''
+    pa = parquet_io.pa
+    pos_type = pa.struct([('start', pa.int64()), ('end', pa.int64())])
+    mod_type = pa.struct([('residue', pa.string()), ('position', pa.int64()), ('mass', pa.float64())])
+    codes = pa.array(codes)
+    # the position of the empty sequences is a list [(0,0)]
+    as_pos = lambda x: x[0] if isinstance(x, list) else x
+    cols = [(('peptide_raw','STATS'), pa.array(list(rep[f"{hp}_raw"]), pa.string()))]
+    if all_hits:
+        cols.append((('peptide_pos','STATS'), pa.array([[[as_pos(j) for j in i] for i in p] for p in rep[f"{hp}_allpos"]], pa.list_(pa.list_(pos_type)))))
+    else:
+        cols.append((('peptide_pos','STATS'), pa.array([[as_pos(i) for i in p] for p in rep[f"{hp}_pos"]], pa.list_(pos_type))))
+    cols.append((('modification_pos','STATS'), pa.array(list(rep["modification_pos"]), pa.list_(mod_type))))
+    cols.append((('protein_seqlen','STATS'), pa.array(list(rep[f"{hq}_seqlen"]), pa.list_(pa.int64()))))
+    cols.append((('protein_seqmw','STATS'), pa.array(list(rep[f"{hq}_seqmw"]), pa.list_(pa.float64()))))
+    if f"{hq}_coverage" in rep.columns:
+        cols.append((('protein_coverage','STATS'), pa.array(list(rep[f"{hq}_coverage"]), pa.list_(pa.float64()))))
+    # map the values back to the rows
+    for h,v in cols:
+        table = parquet_io.append_column(table, h, v.take(codes))
+    return table
+
+def read_report_columns(ifile, headers):
+    '''
+    Read only the given columns (header tuples) of the report with two header rows
+    '''
+    with open(ifile, 'rb') as f:
+        h1 = f.readline().decode('utf-8').rstrip('\r\n').split('\t')
+        h2 = f.readline().decode('utf-8').rstrip('\r\n').split('\t')
+    cols = list(zip(h1, h2))
+    cc = [h for h in headers if h not in cols]
+    if len(cc) > 0:
+        sms = f"The specified columns do not exist in the provided table: {cc}"
+        logging.error(sms)
+        sys.exit(sms)
+    idx = [cols.index(h) for h in headers]
+    # keep the blank lines so the rows are aligned with the lines of the file
+    df = pd.read_csv(ifile, sep="\t", header=None, skiprows=2, usecols=idx, dtype=str, na_values=['NA', 'excluded'], skip_blank_lines=False, quoting=csv.QUOTE_NONE)
+    df = df[idx]
+    df.columns = pd.MultiIndex.from_tuples(headers)
+    return df
+
+def append_columns(ifile, ofile, df):
+    '''
+    Stream the report line by line to the output file, appending the columns of the dataframe (strings) as raw bytes.
+    The original columns are not parsed.
+    '''
+    heads = ['\t'.join([str(c[0]) for c in df.columns]), '\t'.join([str(c[1]) for c in df.columns])]
+    tails = ['\t'.join(r) for r in zip(*[df[c].fillna('').astype(str) for c in df.columns])]
+    n = 0
+    with open(ifile, 'rb') as fi, open(ofile, 'wb') as fo:
+        for i,line in enumerate(fi):
+            n = i - 1
+            body = line.rstrip(b'\r\n')
+            # the blank lines are kept as they are
+            if i >= 2 and body == b'':
+                fo.write(line)
+                continue
+            eol = line[len(body):] or b'\n'
+            tail = heads[i] if i < 2 else tails[i-2]
+            fo.write(body + b'\t' + tail.encode('utf-8') + eol)
+    if n != len(tails):
+        sms = f"The number of rows of the report ({n}) does not match the results ({len(tails)})"
+        logging.error(sms)
+        sys.exit(sms)
+
+def main_chunks(ifile1, ifile2, hp, hq, ofile, chunksize, all_hits=False, ofile_depth=None, executor=None, n_workers=1, ofmt='tsv'):
+    '''
+    Process the report in chunks of rows with bounded memory.
+    The first pass computes the positions per chunk and keeps a summary of the distinct peptide ranges per protein.
+    The second pass adds the protein coverage.
+    '''
+    logging.info("reading the metadata of fasta file...")
+    fasta_meta_all = fasta_meta.load_meta(ifile2, molweight.calculate_molecular_weights)
+
+    # the values of untouched columns are copied as text
+    tmpfile = f"{ofile}.tmp"
+    writer = None
+    protein_pep_pos = {}
+    fasta_proteins_seqlen = {}
+    logging.info(f"reading report file in chunks of {chunksize} rows...")
+    for i,report in enumerate(pd.read_csv(ifile1, sep="\t", header=[0,1], na_values=['NA', 'excluded'], dtype=str, chunksize=chunksize)):
+        logging.info(f"processing the chunk {i+1}...")
+        rep, codes = parse_report(report, hp, hq)
+        proteins = rep[f"{hq}_raw"].explode().drop_duplicates().tolist()
+        # read only the sequences used in the chunk
+        meta, seqlen, seqmw = read_fasta_proteins(fasta_meta_all, proteins)
+        peptide_hits = locate_peptides(ifile2, meta, rep, hp, hq, executor, n_workers)
+        rep = add_positions(rep, hp, hq, peptide_hits, seqlen, seqmw, all_hits)
+        # update the summary of peptide ranges per protein
+        protein_pep_pos = get_pep_ranges(rep, hp, hq, protein_pep_pos)
+        fasta_proteins_seqlen.update(seqlen)
+        if ofmt == 'parquet':
+            table = add_results_arrow(parquet_io.from_pandas(report), rep, codes, hp, hq, all_hits)
+            writer = writer or parquet_io.pq.ParquetWriter(tmpfile, table.schema)
+            writer.write_table(table.cast(writer.schema))
+        else:
+            report = add_results(report, rep, codes, hp, hq, all_hits)
+            report.to_csv(tmpfile, sep="\t", index=False, header=(i == 0), mode='w' if i == 0 else 'a')
+    if writer:
+        writer.close()
+
+    logging.info("getting the protein coverage...")
+    protein_depth = get_depth(protein_pep_pos, fasta_proteins_seqlen)
+    if ofile_depth:
+        logging.info("printing the peptide depth file...")
+        write_depth(ofile_depth, get_depth(protein_pep_pos, fasta_proteins_seqlen, found_only=True), fasta_proteins_seqlen)
+
+    logging.info("adding the protein coverage in chunks...")
+    if ofmt == 'parquet':
+        pa = parquet_io.pa
+        pf = parquet_io.pq.ParquetFile(tmpfile)
+        writer = None
+        for batch in pf.iter_batches(batch_size=chunksize):
+            table = pa.Table.from_batches([batch], schema=pf.schema_arrow)
+            # compute the coverage once per unique list of proteins
+            codes, proteins = pd.factorize(pd.Series(parquet_io.get_column(table, (hq,'LEVEL')).to_pylist()).fillna(''))
+            proteins_raw = [re.split(r"\s*;\s*", q) for q in proteins]
+            protein_coverage = get_coverage(proteins_raw, protein_depth, fasta_proteins_seqlen)
+            values = pa.array(protein_coverage, pa.list_(pa.float64())).take(pa.array(codes))
+            table = parquet_io.append_column(table, ('protein_coverage','STATS'), values)
+            writer = writer or parquet_io.pq.ParquetWriter(ofile, table.schema)
+            writer.write_table(table)
+        if writer:
+            writer.close()
+    else:
+        for i,report in enumerate(pd.read_csv(tmpfile, sep="\t", header=[0,1], dtype=str, keep_default_na=False, chunksize=chunksize)):
+            # compute the coverage once per unique list of proteins
+            codes, proteins = pd.factorize(report[(hq,'LEVEL')])
+            proteins_raw = [re.split(r"\s*;\s*", q) for q in proteins]
+            protein_coverage = get_coverage(proteins_raw, protein_depth, fasta_proteins_seqlen)
+            report[('protein_coverage','STATS')] = broadcast([';'.join(map(str,p)) for p in protein_coverage], codes)
+            report.to_csv(ofile, sep="\t", index=False, header=(i == 0), mode='w' if i == 0 else 'a')
+    os.remove(tmpfile)
+
+
+#################
+# Main function #
+#################
+def main(args):
+    '''
+    Main function
+    '''    
+    logging.info("getting the input parameters...")
+    ifile1 = args.i
+    ifile2 = args.f
+    hp  = args.hp
+    hq  = args.hq
+    ofile = args.o
+    all_hits = args.a
+    chunksize = args.n
+    ofile_depth = args.od
+    n_workers = args.w
+    ofmt = args.ft
+    stream = args.s
+    # ifile1 = r"S:\U_Proteomica\UNIDAD\Softwares\jmrodriguezc\SANPRO\tests\test4\Npep2prot.tsv"
+    # ifile2 = r"S:\U_Proteomica\UNIDAD\Softwares\jmrodriguezc\SANPRO\tests\test4\mouse_202206_uni-sw-tr.target.fasta"
+    # hp  = 'peptide'
+    # hq  = 'protein'
+    # ofile = r"S:\U_Proteomica\UNIDAD\Softwares\jmrodriguezc\SANPRO\tests\test4\Npep2prot.new2.tsv"
     
+    
+    # check the optional dependency of the Parquet output
+    if ofmt == 'parquet':
+        parquet_io.check_pyarrow()
+        if stream:
+            sys.exit("The Parquet output cannot be used with the -s option")
+
+    # create the pool of processes for the sharded execution, if applicable
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else None
+    
+    # process the report in chunks, if applicable
+    if chunksize:
+        main_chunks(ifile1, ifile2, hp, hq, ofile, chunksize, all_hits, ofile_depth, executor, n_workers, ofmt)
+        if executor:
+            executor.shutdown()
+        return
+
+
+
+    logging.info("reading report file...")
+    # Two headers:
+    if stream:
+        # only the peptide and protein columns
+        report = read_report_columns(ifile1, [(hp,'LEVEL'),(hq,'LEVEL')])
+    else:
+        report = pd.read_csv(ifile1, sep="\t", header=[0,1], na_values=['NA', 'excluded'], low_memory=False) # two header rows
+    # # One header:
+    # report = pd.read_csv(ifile1, sep="\t", na_values=['NA', 'excluded'], low_memory=False)
+
+
+
+    logging.info("parsing the report file into unique (peptide, protein) keys...")
+    rep, codes = parse_report(report, hp, hq)
+
+
+
+    logging.info("extracting the unique protein list...")
+    proteins = rep[f"{hq}_raw"].explode().drop_duplicates().tolist()
+
+
+
+    logging.info("reading the metadata of fasta file...")
+    # get the accession, offset, length and molecular weight (Da) of proteins. It is created once per FASTA file
+    fasta_meta_all = fasta_meta.load_meta(ifile2, molweight.calculate_molecular_weights)
+
+
+
+    logging.info("reading fasta file filtering by the given proteins...")
+    fasta_meta_flt, fasta_proteins_seqlen, fasta_proteins_seqmw = read_fasta_proteins(fasta_meta_all, proteins)
+
+
+
+    logging.info(f"locating the unique peptides in the protein sequences using {n_workers} workers...")
+    peptide_hits = locate_peptides(ifile2, fasta_meta_flt, rep, hp, hq, executor, n_workers)
+    if executor:
+        executor.shutdown()
+
+
+
+    logging.info("getting the sequence and modification positions for the protein list...")
+    rep = add_positions(rep, hp, hq, peptide_hits, fasta_proteins_seqlen, fasta_proteins_seqmw, all_hits)
+
+
+
+    logging.info("getting the protein coverage...")
+    protein_pep_pos = get_pep_ranges(rep, hp, hq)
+    protein_depth = get_depth(protein_pep_pos, fasta_proteins_seqlen)
+    rep[f"{hq}_coverage"] = get_coverage(rep[f"{hq}_raw"], protein_depth, fasta_proteins_seqlen)
+
+
+
+    logging.info("adding the result columns into report...")
+    if ofmt == 'parquet':
+        table = add_results_arrow(parquet_io.from_pandas(report), rep, codes, hp, hq, all_hits)
+    else:
+        report = add_results(report, rep, codes, hp, hq, all_hits)
+
 
 
     logging.info("printing the output file...")
-    report.to_csv(ofile, sep="\t", index=False)
+    if ofmt == 'parquet':
+        parquet_io.pq.write_table(table, ofile)
+    elif stream:
+        # append the result columns to the original lines
+        append_columns(ifile1, ofile, report.iloc[:,2:])
+    else:
+        report.to_csv(ofile, sep="\t", index=False)
+    if ofile_depth:
+        logging.info("printing the peptide depth file...")
+        # the depth only counts the peptides that are found (the coverage keeps the ranges of the baseline)
+        write_depth(ofile_depth, get_depth(protein_pep_pos, fasta_proteins_seqlen, found_only=True), fasta_proteins_seqlen)
 
 
 if __name__ == "__main__":
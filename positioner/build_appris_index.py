@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import os
+import sys
+import argparse
+import logging
+
+#########################
+# Import local packages #
+#########################
+sys.path.append(f"{os.path.dirname(__file__)}/../libs")
+import appris_db
+
+
+###################
+# Parse arguments #
+###################
+
+parser = argparse.ArgumentParser(
+    description='Build the indexes of the APPRIS databases used by get_appris',
+    epilog='''Examples:
+
+    python  build_appris_index.py
+      -w   10
+      -d   Databases/APPRIS/202501/human/human_202501.appris.tsv Databases/APPRIS/202501/mouse/mouse_202501.appris.tsv
+    ''',
+    formatter_class=argparse.RawTextHelpFormatter)
+parser.add_argument('-d',   required=True, nargs='+', help='APPRIS databases in GTF format')
+parser.add_argument('-m',   default='tabix,index', help='List of indexes separated by commas: tabix (bgzip and tabix files), index (interval index) (default: %(default)s)')
+parser.add_argument('-w',   type=int, default=4, help='Number of threads for the compression (default: %(default)s)')
+parser.add_argument('-f',   action='store_true', help='Rebuild the indexes even if the databases have not changed')
+args = parser.parse_args()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%m/%d/%Y %I:%M:%S %p')
+
+
+#################
+# Main function #
+#################
+def main(args):
+    '''
+    Main function
+    '''
+    logging.info("getting the input parameters...")
+    db_ifiles = args.d
+    modes = [ m.strip() for m in args.m.split(',') if m.strip() != '' ]
+    n_workers = args.w
+
+    # checking the parameters
+    for m in modes:
+        if m not in ('tabix','index'):
+            sms = f"The index type '{m}' is not valid (tabix, index)"
+            logging.error(sms)
+            sys.exit(sms)
+    for db_ifile in db_ifiles:
+        if not os.path.exists(db_ifile):
+            sms = f"The APPRIS database file does not exist: {db_ifile}"
+            logging.error(sms)
+            sys.exit(sms)
+
+    for db_ifile in db_ifiles:
+        logging.info(f"building the indexes of {db_ifile}...")
+        if 'tabix' in modes:
+            appris_db.build_tabix(db_ifile, n_workers, args.f)
+        if 'index' in modes:
+            appris_db.build_interval_index(db_ifile, args.f)
+
+
+if __name__ == "__main__":
+    # start main function
+    logging.info('start script: '+"{0}".format(" ".join([x for x in sys.argv])))
+    main(args)
+    logging.info('end script')
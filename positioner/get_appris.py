@@ -9,12 +9,21 @@ import os
 import argparse
 import logging
 import re
+import csv
 import pandas as pd
 import numpy as np
-import subprocess
 import concurrent.futures
 from itertools import repeat
 
+#########################
+# Import local packages #
+#########################
+sys.path.append(f"{os.path.dirname(__file__)}/../libs")
+import tabix
+import interval_index
+import appris_db
+import query_cache
+import service
 
 
 ###################
@@ -31,13 +40,25 @@ parser = argparse.ArgumentParser(
       -c   q,b,e
       -d   Databases/APPRIS/202501/human/human_202501.appris.tsv
       -o   tests/test7/appris_annots.tsv
+
+    python  get_appris.py  -m index  -d Databases/APPRIS/202501/human/human_202501.appris.tsv  -S /tmp/appris_human.sock
+    python  get_appris.py  -C /tmp/appris_human.sock  -i tests/test7/Paths_PDMTableMaker_PDMTable_GM_2.txt  -c q,b,e  -o tests/test7/appris_annots.tsv
     ''',
     formatter_class=argparse.RawTextHelpFormatter)
 parser.add_argument('-w',   type=int, default=4, help='Number of threads/n_workers (default: %(default)s)')
-parser.add_argument('-i',   required=True, help='Table that contains protein and positions')
-parser.add_argument('-c',   required=True, help='List of columns separated by commas that contain the protein ID, as well as the start position and end position')
-parser.add_argument('-d',   required=True, help='APPRIS database in GTF format. By default, it is the local human database')
-parser.add_argument('-o',   required=True, help='Output file that is the Report file with the peptide positions')
+parser.add_argument('-i',   help='Table that contains protein and positions')
+parser.add_argument('-c',   help='List of columns separated by commas that contain the protein ID, as well as the start position and end position')
+parser.add_argument('-d',   help='APPRIS database in GTF format. By default, it is the local human database')
+parser.add_argument('-o',   help='Output file that is the Report file with the peptide positions')
+parser.add_argument('-oj',  help='Output file with the input table plus the annotations as new columns (the values of the annotations of every row are joined by "|")')
+parser.add_argument('-qc',  help='Cache file (SQLite) of the query results. The results are reused between runs with the same APPRIS database')
+parser.add_argument('-qn',  type=int, default=query_cache.MAX_ENTRIES, help='Maximum number of regions in the cache file; the least recently used are evicted (default: %(default)s)')
+parser.add_argument('-S',   help='Serve mode: load the index of the database once and answer the queries on the given address (Unix socket file or [host:]port)')
+parser.add_argument('-C',   help='Client mode: send the queries to the service on the given address (Unix socket file or [host:]port)')
+parser.add_argument('-m',   choices=['tabix','sweep','index'], default='tabix', help='''Query mode (default: %(default)s):
+  tabix: random-access queries using the tabix index
+  sweep: sort the queries and join them with the annotations in a single pass over the bgzip file
+  index: vectorized queries using the memory-mapped interval index of the database (<db>.idx)''')
 args = parser.parse_args()
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%m/%d/%Y %I:%M:%S %p')
@@ -46,6 +67,8 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', date
 #############
 # Constants #
 #############
+# separator of the values of the annotations of a row in the joined table
+ANNOT_SEP = '|'
 
 
 
@@ -82,25 +105,182 @@ def split_2strs(x,a,b):
     except:
         return []
     
-def run_tabix(q, bgzip, header):
-    # get inputs from the query
-    I = q[0]
-    Q = q[1]
-    # execute command
-    proc = subprocess.Popen([f"tabix {bgzip} '{Q}'"], stdout=subprocess.PIPE, stderr=subprocess.PIPE,  shell=True)
-    (out, err) = proc.communicate()
-    proc.stdout.close()  # close explicitly
-    proc.stderr.close()
-    proc.wait()  # ensure cleanup
-    # convert bytes to strin
-    out_str = out.decode('utf-8')
-    # pre-processing the data
-    out_dat = [ o.split('\t') for o in out_str.split('\n') if o != '']
-    # create df
-    df = pd.DataFrame(out_dat, columns=header)
-    # insert the query in the first column
-    df.insert(loc=0, column='query', value=I)
-    return df
+def get_region(q):
+    # the region is the query itself if it is not a tuple
+    return q if isinstance(q, str) else q[-1]
+
+def get_row_queries(q_rep, n_cols):
+    '''
+    Expand every row of the table into its queries (cross product of proteins and positions)
+
+    Returns a list of tuples (row index, query, region).
+    '''
+    q_rows = []
+    for i,q in enumerate(q_rep.itertuples(index=False, name=None)):
+        if pd.isna(q[0]):
+            continue
+        # q_cols = ['q','b','e']
+        if n_cols == 3:
+            qq = split_2strs(str(q[0]),str(q[1]),str(q[2]))
+        # q_cols = ['q','f']
+        elif n_cols == 2:
+            qq = split_str(str(q[0]),str(q[1]))
+        # q_cols = ['q']
+        else:
+            qq = [str(q[0])]
+        for x in qq:
+            q_rows.append((i, x if isinstance(x, str) else x[0], get_region(x)))
+    return q_rows
+
+def get_region_key(reg):
+    # normalized region string (1-based and inclusive)
+    return f"{reg[0]}:{reg[1]+1}-{reg[2]}"
+
+def plan_queries(q_rows, cache=None):
+    '''
+    Normalize and deduplicate the regions of the queries, and merge the overlapping regions
+    of the same protein into windows that are queried once. The regions found in the cache are not queried.
+
+    Returns
+    -------
+    Dictionary with:
+        regions: unique regions (protein, 0-based start, end)
+        row_regions: index of the region of every query (-1 if the region is not valid)
+        windows: regions to query (str)
+        region_windows: index of the window of every unique region (-1 if it is cached)
+        region_hits: annotations of the cached regions (None if it is not cached)
+    '''
+    regions, region_ids, row_regions = [], {}, []
+    for _,_,Q in q_rows:
+        reg = tabix.parse_region(Q)
+        if reg is None:
+            row_regions.append(-1)
+            continue
+        if reg not in region_ids:
+            region_ids[reg] = len(regions)
+            regions.append(reg)
+        row_regions.append(region_ids[reg])
+    # get the cached regions
+    region_hits = [None]*len(regions)
+    if cache is not None:
+        cached = query_cache.get(cache, [ get_region_key(r) for r in regions ])
+        region_hits = [ cached.get(get_region_key(r)) for r in regions ]
+    # merge the overlapping regions of the same protein
+    windows, region_windows = [], [-1]*len(regions)
+    for i in sorted(range(len(regions)), key=lambda i: regions[i]):
+        if region_hits[i] is not None:
+            continue
+        name, beg, end = regions[i]
+        if windows and windows[-1][0] == name and beg <= windows[-1][2]:
+            windows[-1][2] = max(windows[-1][2], end)
+        else:
+            windows.append([name, beg, end])
+        region_windows[i] = len(windows)-1
+    return {
+        'regions': regions,
+        'row_regions': row_regions,
+        'windows': [ get_region_key(w) for w in windows ],
+        'region_windows': region_windows,
+        'region_hits': region_hits
+    }
+
+def get_region_hits(q_plan, window_hits):
+    '''
+    Annotations of every unique region, filtering the annotations of its window by the overlap
+    (or the cached annotations)
+    '''
+    records = []
+    for out_lines in window_hits:
+        recs = []
+        for o in out_lines:
+            fields = o.split('\t', interval_index.COL_END+1)
+            beg = int(fields[interval_index.COL_BEG]) - 1
+            recs.append((beg, max(int(fields[interval_index.COL_END]), beg+1), o))
+        records.append(recs)
+    return [ h if h is not None else [ o for b,e,o in records[w] if b < end and e > beg ] for (_,beg,end),w,h in zip(q_plan['regions'], q_plan['region_windows'], q_plan['region_hits']) ]
+
+def open_engine(q_mode, db_files):
+    '''
+    Load the index of the database for the given query mode
+    '''
+    if q_mode == 'index':
+        logging.info("loading the interval index...")
+        return {'mode': q_mode, 'index': interval_index.load_index(db_files['idx'])}
+    logging.info("loading the tabix index...")
+    return {'mode': q_mode, 'reader': tabix.open_tabix(db_files['bgzip'], db_files['tbi'])}
+
+def close_engine(engine):
+    if 'reader' in engine:
+        tabix.close_tabix(engine['reader'])
+
+def query_windows(engine, q_windows, n_workers):
+    '''
+    Annotations of every window (list of lines)
+    '''
+    if engine['mode'] == 'index':
+        q_hits = interval_index.query(engine['index'], q_windows)
+        return [ q_hits[w] for w in q_windows ]
+    elif engine['mode'] == 'sweep':
+        q_hits = tabix.sweep(engine['reader'], q_windows)
+        return [ q_hits[w] for w in q_windows ]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_workers) as executor:
+        return list(executor.map(tabix.query, repeat(engine['reader']), q_windows))
+
+def serve_appris(address, q_mode, db_header, db_files, n_workers):
+    '''
+    Load the index of the database once and answer the batches of windows sent by the clients
+    '''
+    engine = open_engine(q_mode, db_files)
+    routes = {
+        '/info': lambda payload: {'header': db_header, 'checksum': db_files['checksum'], 'mode': q_mode},
+        '/query': lambda payload: {'hits': query_windows(engine, payload.get('windows', []), n_workers)}
+    }
+    service.serve(address, routes)
+    close_engine(engine)
+
+def request_service(address, path, payload=None):
+    try:
+        return service.request(address, path, payload)
+    except (OSError, RuntimeError) as exc:
+        sms = f"The request to the APPRIS service ({address}) has failed: {exc}"
+        logging.error(sms)
+        sys.exit(sms)
+
+def write_hits(ofile, header, q_rows, row_regions, region_hits):
+    '''
+    Stream the annotations of every query into the output file.
+    The duplicated rows are discarded (by hashing) as they arrive.
+    '''
+    seen = set()
+    with open(ofile, 'w', newline='') as f:
+        writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+        writer.writerow(['query']+header)
+        for (_,I,_),r in zip(q_rows, row_regions):
+            if r < 0:
+                continue
+            for o in region_hits[r]:
+                k = (I, o)
+                if k in seen:
+                    continue
+                seen.add(k)
+                writer.writerow([I]+o.split('\t'))
+    return len(seen)
+
+def write_table(ofile, q_rep, header, q_rows, row_regions, region_hits):
+    '''
+    Print the input table adding the annotations of every row as new columns
+    '''
+    # the annotations of every row without duplicates (in the order they arrive)
+    row_hits = [ {} for _ in range(len(q_rep)) ]
+    for (i,_,_),r in zip(q_rows, row_regions):
+        if r < 0:
+            continue
+        row_hits[i].update(dict.fromkeys(region_hits[r]))
+    row_fields = [ [ o.split('\t') for o in hits ] for hits in row_hits ]
+    df = q_rep.copy()
+    for j,h in enumerate(header):
+        df[f"appris_{h.lstrip('#')}"] = [ ANNOT_SEP.join([ x[j] if j < len(x) else '' for x in fields ]) for fields in row_fields ]
+    df.to_csv(ofile, sep="\t", index=False)
 
 
 
@@ -113,77 +293,104 @@ def main(args):
     '''    
     logging.info("getting the input parameters...")
     n_workers = args.w
+    q_mode = args.m
     q_ifile = args.i
     db_ifile = args.d
-    q_cols  = re.split(r'\s*,\s*', args.c.strip())
+    q_cols  = re.split(r'\s*,\s*', args.c.strip()) if args.c else []
     ofile = args.o
+    ofile_table = args.oj
+    cache_file = args.qc
+    service_address = args.C
     
 
-    # checking the appris database file
-    if not os.path.exists(db_ifile):
-        sys.exit("The APPRIS database file does not exist")
-    
-    
-    logging.info("getting the header of appris database file...")
-    db_header = pd.read_csv(db_ifile, sep="\t", nrows=0).columns.tolist()
+    # checking the parameters
+    if not args.S and not (q_ifile and q_cols and ofile):
+        sms = "The -i, -c and -o parameters are required (except in the serve mode)"
+        logging.error(sms)
+        sys.exit(sms)
+    if not service_address and not db_ifile:
+        sms = "The -d parameter is required (except in the client mode)"
+        logging.error(sms)
+        sys.exit(sms)
+
+
+    if service_address:
+        logging.info("getting the header of appris database from the service...")
+        info = request_service(service_address, '/info')
+        db_header = info['header']
+        db_files = {'checksum': info['checksum']}
+    else:
+        # checking the appris database file
+        if not os.path.exists(db_ifile):
+            sys.exit("The APPRIS database file does not exist")
+        
+        
+        logging.info("getting the header of appris database file...")
+        db_header = pd.read_csv(db_ifile, sep="\t", nrows=0).columns.tolist()
 
 
-    # creating a bgzip if applied...
-    dbfile_bgzip = f"{db_ifile}.gz"
-    if os.path.exists(dbfile_bgzip):
-        logging.info("caching a bgzip file")
-    else:
-        logging.info("sorting and creating a bgzip...")
-        os.system(f"(grep '^#' '{db_ifile}'; grep -v '^#' '{db_ifile}' | sort -t\"`printf '\t'`\" -k1,1 -k4,4n) | bgzip > '{dbfile_bgzip}'")
-    # creating a tbi if applied...
-    dbfile_tbi = f"{dbfile_bgzip}.tbi"
-    if os.path.exists(dbfile_tbi):
-        logging.info("caching a tabix file")
-    else:
-        logging.info("creating a tabix...")
-        os.system(f"tabix -p gff '{dbfile_bgzip}'")
+        # creating the indexes if applied (they are rebuilt when the database changes)...
+        if q_mode == 'index':
+            db_files = appris_db.build_interval_index(db_ifile)
+        else:
+            db_files = appris_db.build_tabix(db_ifile, n_workers)
+
+
+    if args.S:
+        serve_appris(args.S, q_mode, db_header, db_files, n_workers)
+        return
 
 
 
 
-    logging.info(f"reading protein table using the {q_cols} columns...")
-    q_rep = pd.read_csv(q_ifile, sep="\t", usecols=q_cols, low_memory=False)
+    if ofile_table:
+        logging.info("reading protein table...")
+        q_tbl = pd.read_csv(q_ifile, sep="\t", low_memory=False)
+        q_rep = q_tbl[q_cols]
+    else:
+        logging.info(f"reading protein table using the {q_cols} columns...")
+        q_rep = pd.read_csv(q_ifile, sep="\t", usecols=q_cols, low_memory=False)[q_cols]
     
     
     
     
-    logging.info("pre-processing the queries...")
-    # zip the columns depending the N cols
-    # if there are multiple queries (start and end positions joined by ;) in one query, we split the query
-    # q_cols = ['q','b','e']
-    if len(q_cols) == 3:
-        q_query = list(zip(q_rep.iloc[:,0], q_rep.iloc[:,1], q_rep.iloc[:,2]))
-        q_query = [ qq for q in q_query if not pd.isna(q[0]) for qq in split_2strs(str(q[0]),str(q[1]),str(q[2])) ]
-    # q_cols = ['q','f']
-    elif len(q_cols) == 2:
-        q_query = list(zip(q_rep.iloc[:,0], q_rep.iloc[:,1]))
-        q_query = [ qq for q in q_query if not pd.isna(q[0]) for qq in split_str(str(q[0]),str(q[1])) ]
-    # q_cols = ['q']
-    else:
-        q_query = list(zip(q_rep.iloc[:,0]))
-    # unique queries
-    q_query = list(set(q_query))
+    cache = None
+    if cache_file:
+        logging.info("opening the query cache...")
+        cache = query_cache.open_cache(cache_file, db_files['checksum'], args.qn)
 
 
+    logging.info("pre-processing the queries...")
+    # if there are multiple queries (start and end positions joined by ;) in one row, we split the query
+    q_rows = get_row_queries(q_rep, len(q_cols))
+    # deduplicate the regions and merge the overlapping ones (that are not cached)
+    q_plan = plan_queries(q_rows, cache)
+    logging.info(f"{len(q_rows)} queries, {len(q_plan['regions'])} unique regions, {len(q_plan['windows'])} windows")
 
 
-    logging.info("querying the protein:start-end in the appris annotations database...")
-    with concurrent.futures.ThreadPoolExecutor(max_workers=n_workers) as executor:         
-        q_results = executor.map( run_tabix, q_query, repeat(dbfile_bgzip), repeat(db_header))
-    q_result = pd.concat(q_results)
-    # drop duplicates
-    q_result = q_result.drop_duplicates()
 
 
+    window_hits = []
+    if q_plan['windows'] and service_address:
+        logging.info("querying the protein:start-end in the appris service...")
+        window_hits = request_service(service_address, '/query', {'windows': q_plan['windows']})['hits']
+    elif q_plan['windows']:
+        engine = open_engine(q_mode, db_files)
+        logging.info("querying the protein:start-end in the appris annotations database...")
+        window_hits = query_windows(engine, q_plan['windows'], n_workers)
+        close_engine(engine)
+    region_hits = get_region_hits(q_plan, window_hits)
+    if cache is not None:
+        query_cache.put(cache, { get_region_key(r): h for r,h,c in zip(q_plan['regions'], region_hits, q_plan['region_hits']) if c is None })
+        query_cache.close_cache(cache)
 
 
     logging.info("printing the output file...")
-    q_result.to_csv(ofile, sep="\t", index=False)
+    n_hits = write_hits(ofile, db_header, q_rows, q_plan['row_regions'], region_hits)
+    logging.info(f"{n_hits} annotations have been printed")
+    if ofile_table:
+        logging.info("printing the input table with the annotations...")
+        write_table(ofile_table, q_tbl, db_header, q_rows, q_plan['row_regions'], region_hits)
     
 
 
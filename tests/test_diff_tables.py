@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import os
+import sys
+import random
+import subprocess
+import tempfile
+import unittest
+
+####################
+# Global variables #
+####################
+
+SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'basic', 'diff_tables.py')
+
+
+####################
+# Common functions #
+####################
+
+def diff_tables(cfile, params):
+    '''
+    Run the program with a config file
+    '''
+    with open(cfile, 'w') as f:
+        f.write("[DIFF_TABLES]\n" + ''.join([ f"{k} = {v}\n" for k,v in params.items() ]))
+    return subprocess.run([sys.executable, SCRIPT, '-c', cfile], capture_output=True, text=True)
+
+def write_table(ofile, header, rows):
+    with open(ofile, 'w') as f:
+        f.write('\n'.join([ '\t'.join(r) for r in [header]+rows ])+'\n')
+
+def read_lines(ofile):
+    with open(ofile) as f:
+        return f.read().split('\n')[:-1]
+
+def brute_force(header1, rows1, header2, rows2, cols):
+    '''
+    The rows whose key (the given columns or the whole row) occurs once within both files, with the columns of
+    both files and the label of the file (as the concatenation of the files without the duplicated keys)
+    '''
+    out_cols = header1 + [ c for c in header2 if c not in header1 ]
+    rows = [ (dict(zip(header1, r)), 'file1') for r in rows1 ] + [ (dict(zip(header2, r)), 'file2') for r in rows2 ]
+    rows = [ ([ r.get(c, '') for c in out_cols ], l) for r,l in rows ]
+    idx = [ out_cols.index(c) for c in cols ] if cols else range(len(out_cols))
+    keys = [ tuple([ r[i] for i in idx ]) for r,_ in rows ]
+    counts = {}
+    for k in keys:
+        counts[k] = counts.get(k, 0) + 1
+    return ['\t'.join(out_cols+['file_label'])] + [ '\t'.join(r+[l]) for (r,l),k in zip(rows, keys) if counts[k] == 1 ]
+
+
+##################
+# Test functions #
+##################
+
+class TestDiffTables(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dir = self.tmpdir.name
+        self.ifile1 = os.path.join(self.dir, 'in1.tsv')
+        self.ifile2 = os.path.join(self.dir, 'in2.tsv')
+        self.ofile = os.path.join(self.dir, 'out.tsv')
+        self.cfile = os.path.join(self.dir, 'c.ini')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def run_diff(self, header1, rows1, header2, rows2, cols):
+        write_table(self.ifile1, header1, rows1)
+        write_table(self.ifile2, header2, rows2)
+        params = {'infile1': self.ifile1, 'infile2': self.ifile2, 'outfile': self.ofile}
+        if cols is not None:
+            params['cols'] = ', '.join(cols)
+        proc = diff_tables(self.cfile, params)
+        self.assertEqual(proc.returncode, 0, msg=proc.stderr)
+        return read_lines(self.ofile)
+
+    def test_duplicates(self):
+        '''
+        The duplicated rows are not different, also if they are within the same file
+        '''
+        header = ['idsup', 'idinf', 'tags']
+        rows1 = [['A', '1', 'out'], ['A', '1', 'out'], ['B', '2', ''], ['C', '3', 'in']]
+        rows2 = [['B', '2', ''], ['D', '4', 'in'], ['D', '4', 'in'], ['E', '5', 'out'], ['C', '3', 'out']]
+        out = self.run_diff(header, rows1, header, rows2, [])
+        self.assertEqual(out, brute_force(header, rows1, header, rows2, []))
+        self.assertEqual(out[1:], ['C\t3\tin\tfile1', 'E\t5\tout\tfile2', 'C\t3\tout\tfile2'])
+
+    def test_keys(self):
+        '''
+        The comparison based on the given columns (key-only) and based on all the columns
+        '''
+        header = ['idsup', 'idinf', 'tags']
+        rows1 = [['A', '1', 'out'], ['B', '2', 'in'], ['C', '3', 'in']]
+        rows2 = [['A', '1', 'in'], ['B', '2', 'in'], ['C', '9', 'in']]
+        out = self.run_diff(header, rows1, header, rows2, ['idsup', 'idinf'])
+        self.assertEqual(out, brute_force(header, rows1, header, rows2, ['idsup', 'idinf']))
+        self.assertEqual(out[1:], ['C\t3\tin\tfile1', 'C\t9\tin\tfile2'])
+        out = self.run_diff(header, rows1, header, rows2, ['idsup'])
+        self.assertEqual(out, [ '\t'.join(header+['file_label']) ])
+        out = self.run_diff(header, rows1, header, rows2, ['tags'])
+        self.assertEqual(out[1:], ['A\t1\tout\tfile1'])
+        out = self.run_diff(header, rows1, header, rows2, [])
+        self.assertEqual(out, brute_force(header, rows1, header, rows2, []))
+        self.assertEqual(out[1:], ['A\t1\tout\tfile1', 'C\t3\tin\tfile1', 'A\t1\tin\tfile2', 'C\t9\tin\tfile2'])
+
+    def test_empty_cols(self):
+        '''
+        Without the columns (empty or missing in the config), all the columns are compared
+        '''
+        header = ['idsup', 'tags']
+        rows1 = [['A', 'out'], ['B', 'in']]
+        rows2 = [['A', 'out'], ['B', 'out']]
+        expected = ['idsup\ttags\tfile_label', 'B\tin\tfile1', 'B\tout\tfile2']
+        self.assertEqual(self.run_diff(header, rows1, header, rows2, []), expected)
+        self.assertEqual(self.run_diff(header, rows1, header, rows2, None), expected)
+
+    def test_columns(self):
+        '''
+        The files have different columns: the output has the columns of both files (empty if they are missing)
+        '''
+        header1, header2 = ['idsup', 'tags'], ['idsup', 'n', 'tags']
+        rows1 = [['A', 'out'], ['B', 'in'], ['C', 'in']]
+        rows2 = [['A', '', 'out'], ['B', '2', 'in'], ['D', '1', 'in']]
+        out = self.run_diff(header1, rows1, header2, rows2, [])
+        self.assertEqual(out, brute_force(header1, rows1, header2, rows2, []))
+        self.assertEqual(out[1:], ['B\tin\t\tfile1', 'C\tin\t\tfile1', 'B\tin\t2\tfile2', 'D\tin\t1\tfile2'])
+
+    def test_random(self):
+        '''
+        Many rows (several chunks of the reader), with duplicated keys within and between the files
+        '''
+        rnd = random.Random(1)
+        header = ['idsup', 'idinf', 'tags']
+        get_rows = lambda n: [ [f"P{rnd.randint(0, 30000)}", str(rnd.randint(0, 3)), rnd.choice(['out', 'in', '', 'NA'])] for _ in range(n) ]
+        rows1, rows2 = get_rows(120000), get_rows(110000)
+        for cols in ([], ['idsup', 'idinf']):
+            out = self.run_diff(header, rows1, header, rows2, cols)
+            self.assertEqual(out, brute_force(header, rows1, header, rows2, cols), msg=cols)
+            self.assertGreater(len(out), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
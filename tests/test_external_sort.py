@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import os
+import sys
+import glob
+import random
+import tempfile
+import unittest
+import pandas as pd
+
+#########################
+# Import local packages #
+#########################
+sys.path.append(f"{os.path.dirname(__file__)}/../libs")
+import common
+import external_sort
+
+
+####################
+# Common functions #
+####################
+
+def get_rows(n, seed):
+    '''
+    Rows with many ties, numbers as text, and missing values (common.NA_VALUES and empty values)
+    '''
+    rnd = random.Random(seed)
+    na = ['NA', 'excluded', None]
+    rows = []
+    for i in range(n):
+        k1 = rnd.choice(['P1', 'P10', 'P2', 'Q', 'a'] + na)
+        k2 = rnd.choice(['-1', '0.5', '2', '10', '1e2', '3.0', 'x'] + na)
+        rows.append([str(i), k1, k2])
+    return rows
+
+def sort_key(value, numeric):
+    '''
+    Missing values at the end, and the numeric columns as numbers (the values that are not numbers are missing)
+    '''
+    if value is None or value in common.NA_VALUES:
+        return (1, 0)
+    if numeric:
+        try:
+            return (0, float(value))
+        except ValueError:
+            return (1, 0)
+    return (0, value)
+
+def brute_force(rows, idx, numeric):
+    '''
+    Stable sort of the rows by the given columns
+    '''
+    return sorted(rows, key=lambda r: [ sort_key(r[i], n) for i,n in zip(idx, numeric) ])
+
+def get_chunks(rows, columns, size):
+    return [ pd.DataFrame(rows[i:i+size], columns=columns) for i in range(0, len(rows), size) ]
+
+def read_lines(ofile):
+    with open(ofile) as f:
+        return f.read().split('\n')[:-1]
+
+def to_lines(rows):
+    return [ '\t'.join([ '' if v is None else v for v in r ]) for r in rows ]
+
+
+##################
+# Test functions #
+##################
+
+class TestExternalSort(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dir = self.tmpdir.name
+        self.columns = ['id', 'k1', 'k2']
+        # several runs of several blocks (MIN_BLOCK rows)
+        self.rows = get_rows(25000, 1)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def sort(self, rows, cols, numeric, max_memory=None, columns=None, chunksize=2500):
+        '''
+        Sort the chunks in memory or with a memory budget, and return the lines of the output file
+        '''
+        columns = self.columns if columns is None else columns
+        ofile = os.path.join(self.dir, 'out.tsv')
+        tdir = os.path.join(self.dir, 'tmp')
+        os.makedirs(tdir, exist_ok=True)
+        external_sort.sort_chunks(get_chunks(rows, columns, chunksize), cols, numeric, ofile, max_memory, tdir)
+        # the temporary files are removed
+        self.assertEqual(glob.glob(os.path.join(tdir, '*')), [])
+        return read_lines(ofile)
+
+    def test_sort(self):
+        '''
+        The external sort (several runs) gives the same rows as the in-memory sort and as a stable sort,
+        with numeric and text keys, and the missing values at the end
+        '''
+        for cols,numeric in [(['k2'], [True]), (['k1'], [False]), (['k1', 'k2'], [False, True]), (['k2', 'k1'], [True, False]), (['k2'], [False])]:
+            idx = [ self.columns.index(c) for c in cols ]
+            expected = ['\t'.join(self.columns)] + to_lines(brute_force(self.rows, idx, numeric))
+            self.assertEqual(self.sort(self.rows, cols, numeric), expected, msg=cols)
+            # a spill for every chunk
+            self.assertEqual(self.sort(self.rows, cols, numeric, max_memory=1), expected, msg=cols)
+
+    def test_descending_input(self):
+        '''
+        The input rows are in the reverse order of the keys, so every run goes after the next ones in the merge
+        '''
+        idx, numeric = [1, 2], [False, True]
+        rows = brute_force(self.rows, idx, numeric)[::-1]
+        expected = ['\t'.join(self.columns)] + to_lines(brute_force(rows, idx, numeric))
+        self.assertEqual(self.sort(rows, ['k1', 'k2'], numeric), expected)
+        self.assertEqual(self.sort(rows, ['k1', 'k2'], numeric, max_memory=1), expected)
+        # a budget of a few chunks
+        size = pd.DataFrame(rows[:2500], columns=self.columns).memory_usage(index=True, deep=True).sum()
+        self.assertEqual(self.sort(rows, ['k1', 'k2'], numeric, max_memory=size*5), expected)
+
+    def test_missing(self):
+        '''
+        All the keys are missing values: the order of the input is kept
+        '''
+        rows = [ [str(i), None, 'NA' if i % 2 else 'excluded'] for i in range(3000) ]
+        expected = ['\t'.join(self.columns)] + to_lines(rows)
+        self.assertEqual(self.sort(rows, ['k1', 'k2'], [False, True], max_memory=1, chunksize=1000), expected)
+
+    def test_two_headers(self):
+        '''
+        The columns with two headers are referenced by position
+        '''
+        columns = pd.MultiIndex.from_tuples([('id','LEVEL'), ('k1','REL'), ('k2','STATS')])
+        rows = self.rows[:5000]
+        expected = ['id\tk1\tk2', 'LEVEL\tREL\tSTATS'] + to_lines(brute_force(rows, [2], [True]))
+        self.assertEqual(self.sort(rows, [('k2','STATS')], [True], columns=columns), expected)
+        self.assertEqual(self.sort(rows, [('k2','STATS')], [True], max_memory=1, columns=columns), expected)
+
+    def test_empty(self):
+        ofile = os.path.join(self.dir, 'out.tsv')
+        external_sort.sort_chunks([pd.DataFrame(columns=self.columns, dtype=str)], ['k1'], [False], ofile, 1)
+        self.assertEqual(read_lines(ofile), ['\t'.join(self.columns)])
+
+
+if __name__ == "__main__":
+    unittest.main()
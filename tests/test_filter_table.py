@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import os
+import sys
+import subprocess
+import tempfile
+import unittest
+
+####################
+# Global variables #
+####################
+
+SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'basic', 'filter_table.py')
+
+
+####################
+# Common functions #
+####################
+
+def filter_table(cfile, params):
+    '''
+    Run the program with a config file
+    '''
+    with open(cfile, 'w') as f:
+        f.write("[FILTER_TABLE]\n" + ''.join([ f"{k} = {v}\n" for k,v in params.items() ]))
+    return subprocess.run([sys.executable, SCRIPT, '-c', cfile], capture_output=True, text=True)
+
+def read_lines(ofile):
+    with open(ofile) as f:
+        return f.read().split('\n')[:-1]
+
+
+##################
+# Test functions #
+##################
+
+class TestFilterTable(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dir = self.tmpdir.name
+        self.header = 'idsup\ttags\tFDR\tn\ta\tb'
+        self.rows = [
+            'AAF[160.01]K\tout\t0.01\t10\t1\t2',
+            'BBB\tin\t0.2\t5\t5\t3',
+            'CCC\tout\tNA\t200\t10\t9',
+            'DDD\t\t0.04\t20\t2\t10'
+        ]
+        self.ifile = os.path.join(self.dir, 'in.tsv')
+        with open(self.ifile, 'w') as f:
+            f.write('\n'.join([self.header]+self.rows)+'\n')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_named_filters(self):
+        '''
+        The default filter and the named filters are written into their own files in the same pass
+        '''
+        ofiles = { k: os.path.join(self.dir, f"{k}.tsv") for k in ('out', 'fdr', 'cols', 'idsup') }
+        proc = filter_table(os.path.join(self.dir, 'c.ini'), {
+            'infile': self.ifile,
+            'filter': "([tags] == 'out')",
+            'outfile': ofiles['out'],
+            'filter_fdr': "([FDR] < 0.05) & ([n] >= 10)",
+            'outfile_fdr': ofiles['fdr'],
+            'filter_cols': "[a] < [b]",
+            'outfile_cols': ofiles['cols'],
+            'filter_idsup': "[idsup] == 'AAF[160.01]K'",
+            'outfile_idsup': ofiles['idsup'],
+            'filter_empty': '',
+        })
+        self.assertEqual(proc.returncode, 0, msg=proc.stderr)
+        r = self.rows
+        self.assertEqual(read_lines(ofiles['out']), [self.header, r[0], r[2]])
+        self.assertEqual(read_lines(ofiles['fdr']), [self.header, r[0], r[3]])
+        # the columns are numbers in the whole file, so they are compared as numbers (10 > 9)
+        self.assertEqual(read_lines(ofiles['cols']), [self.header, r[0], r[3]])
+        self.assertEqual(read_lines(ofiles['idsup']), [self.header, r[0]])
+
+    def test_errors(self):
+        '''
+        The malformed filters, the unknown columns and the missing output files stop the program
+        '''
+        cfile = os.path.join(self.dir, 'c.ini')
+        ofile = os.path.join(self.dir, 'out.tsv')
+        proc = filter_table(cfile, {'infile': self.ifile, 'filter': "([n] > 1", 'outfile': ofile})
+        self.assertNotEqual(proc.returncode, 0)
+        self.assertIn("Missing ')'", proc.stderr)
+        proc = filter_table(cfile, {'infile': self.ifile, 'filter': "[m] > 1", 'outfile': ofile})
+        self.assertNotEqual(proc.returncode, 0)
+        self.assertIn("are not in the table", proc.stderr)
+        proc = filter_table(cfile, {'infile': self.ifile, 'filter': "[n] > 1", 'outfile': ofile, 'filter_fdr': "[FDR] < 0.05"})
+        self.assertNotEqual(proc.returncode, 0)
+        self.assertIn("outfile_fdr", proc.stderr)
+        self.assertFalse(os.path.exists(ofile))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import os
+import sys
+import subprocess
+import tempfile
+import unittest
+
+####################
+# Global variables #
+####################
+
+SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'basic', 'get_n_rows.py')
+
+
+####################
+# Common functions #
+####################
+
+def get_n_rows(ifile, ofile, n_rows, mode, seed=''):
+    '''
+    Run the program with a config file, and return the lines of the output file
+    '''
+    cfile = f"{ofile}.ini"
+    with open(cfile, 'w') as f:
+        f.write(f"[GET_N_ROWS]\ninfile = {ifile}\nn_rows = {n_rows}\noutfile = {ofile}\nmode = {mode}\nseed = {seed}\n")
+    subprocess.run([sys.executable, SCRIPT, '-c', cfile], check=True, capture_output=True)
+    with open(ofile, 'rb') as f:
+        return f.read().split(b'\n')[:-1]
+
+
+##################
+# Test functions #
+##################
+
+class TestGetNRows(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dir = self.tmpdir.name
+        # more than one block (1 MB) of rows, so the tail is found across the blocks
+        self.header = b'id\tvalue'
+        self.rows = [ f"{i}\t{'x'*(i % 50)}".encode() for i in range(60000) ]
+        self.ifile = os.path.join(self.dir, 'in.tsv')
+        with open(self.ifile, 'wb') as f:
+            f.write(b'\n'.join([self.header]+self.rows)+b'\n')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_head(self):
+        out = get_n_rows(self.ifile, os.path.join(self.dir, 'out.tsv'), 10, 'head')
+        self.assertEqual(out, [self.header]+self.rows[:10])
+
+    def test_tail(self):
+        ofile = os.path.join(self.dir, 'out.tsv')
+        for n in (0, 1, 10, 59999, 60000, 70000):
+            out = get_n_rows(self.ifile, ofile, n, 'tail')
+            self.assertEqual(out, [self.header]+(self.rows[-n:] if n else []), msg=n)
+
+    def test_tail_without_newline(self):
+        '''
+        The last line of the file does not end with a newline
+        '''
+        ifile = os.path.join(self.dir, 'in2.tsv')
+        with open(ifile, 'wb') as f:
+            f.write(b'\n'.join([self.header]+self.rows))
+        out = get_n_rows(ifile, os.path.join(self.dir, 'out.tsv'), 3, 'tail')
+        self.assertEqual(out, [self.header]+self.rows[-3:])
+
+    def test_sample(self):
+        '''
+        The sample has N distinct rows of the file in the order of the file, and it is reproducible with the seed
+        '''
+        ofile = os.path.join(self.dir, 'out.tsv')
+        out = get_n_rows(self.ifile, ofile, 1000, 'sample', 7)
+        self.assertEqual(out[0], self.header)
+        ids = [ int(r.split(b'\t')[0]) for r in out[1:] ]
+        self.assertEqual(len(set(ids)), 1000)
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(out[1:], [ self.rows[i] for i in ids ])
+        # the sample is spread over the whole file
+        self.assertTrue(25000 < sum(ids)/len(ids) < 35000)
+        self.assertTrue(ids[0] < 1000 and ids[-1] > 59000)
+        self.assertEqual(get_n_rows(self.ifile, ofile, 1000, 'sample', 7), out)
+        # all the rows if N is greater than the number of rows
+        self.assertEqual(get_n_rows(self.ifile, ofile, 70000, 'sample', 7), [self.header]+self.rows)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import os
+import sys
+import gzip
+import random
+import tempfile
+import unittest
+
+#########################
+# Import local packages #
+#########################
+sys.path.append(f"{os.path.dirname(__file__)}/../libs")
+import interval_index
+
+####################
+# Global variables #
+####################
+
+# APPRIS-like annotations (gff columns)
+DB_FILE = os.path.join(os.path.dirname(__file__), 'data', 'appris_htslib.tsv.gz')
+
+
+####################
+# Common functions #
+####################
+
+def brute_force(recs, name, beg, end):
+    '''
+    Records overlapping the 0-based half-open region, in the order of the index (name, start and file order)
+    '''
+    return [ l for n,b,e,l in recs if n == name and b < end and e > beg ]
+
+
+##################
+# Test functions #
+##################
+
+class TestIntervalIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        with gzip.open(DB_FILE, 'rt') as f:
+            lines = f.read().rstrip('\n').split('\n')
+        # the plain database (unsorted, as the APPRIS files)
+        body = lines[1:]
+        random.Random(2).shuffle(body)
+        self.db = os.path.join(self.tmpdir.name, 'appris.tsv')
+        with open(self.db, 'w') as f:
+            f.write('\n'.join([lines[0]]+body)+'\n')
+        recs = [ (l.split('\t')[0], int(l.split('\t')[3])-1, int(l.split('\t')[4]), l) for l in body ]
+        self.recs = sorted(recs, key=lambda r: (r[0], r[1]))
+        self.names = sorted(set([ r[0] for r in recs ]))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_query(self):
+        '''
+        All the regions are queried at once with the same records as a brute-force overlap
+        '''
+        idx_dir = os.path.join(self.tmpdir.name, 'appris.tsv.idx')
+        interval_index.save_index(interval_index.build_index(self.db), idx_dir, {'source': 'test'})
+        self.assertEqual(interval_index.read_manifest(idx_dir)['source'], 'test')
+        index = interval_index.load_index(idx_dir)
+        rnd = random.Random(1)
+        regions = {}
+        for n in self.names:
+            regions[n] = (n, 0, 1 << 29)
+        for _ in range(300):
+            n = rnd.choice(self.names)
+            b = rnd.randint(1, 4000)
+            e = b + rnd.randint(0, 500)
+            regions[f"{n}:{b}-{e}"] = (n, b-1, e)
+            regions[f"{n}:{b}"] = (n, b-1, 1 << 29)
+        hits = interval_index.query(index, list(regions))
+        for r,(n,b,e) in regions.items():
+            self.assertEqual(hits[r], brute_force(self.recs, n, b, e), msg=r)
+
+    def test_regions(self):
+        '''
+        Names with ':' and invalid regions
+        '''
+        index = interval_index.build_index(self.db)
+        whole = brute_force(self.recs, 'sp:Q00001', 0, 1 << 29)
+        hits = interval_index.query(index, ['sp:Q00001', 'sp:Q00001:10-20', 'sp:Q00001:60-70', 'P00002:1-10', 'P00002:20-10', 'P99999:1-10'])
+        self.assertEqual(len(whole), 1)
+        self.assertEqual(hits['sp:Q00001'], whole)
+        self.assertEqual(hits['sp:Q00001:10-20'], whole)
+        self.assertEqual(hits['sp:Q00001:60-70'], [])
+        # a region with coordinates does not return the whole protein
+        self.assertEqual(hits['P00002:1-10'], brute_force(self.recs, 'P00002', 0, 10))
+        self.assertEqual(hits['P00002:20-10'], [])
+        self.assertEqual(hits['P99999:1-10'], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import os
+import sys
+import random
+import unittest
+
+#########################
+# Import local packages #
+#########################
+sys.path.append(f"{os.path.dirname(__file__)}/../libs")
+import locator
+
+
+####################
+# Common functions #
+####################
+
+def find_all(seqs, p):
+    '''
+    All the occurrences of the peptide within the sequences with str.find
+    '''
+    hits = {}
+    for q,s in seqs.items():
+        starts = []
+        c = s.find(p)
+        while c != -1:
+            starts.append(c)
+            c = s.find(p, c + 1) if p else -1
+        if starts:
+            hits[q] = starts
+    return hits
+
+
+##################
+# Test functions #
+##################
+
+class TestLocator(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(1)
+        # a small alphabet gives many overlapping occurrences
+        self.seqs = { f"P{i:05d}": ''.join([random.choice('ACDE') for _ in range(random.randint(0, 300))]) for i in range(200) }
+        seqs = [ s for s in self.seqs.values() if s ]
+        # peptides of every seed length (shorter and longer than KMER_MIN and KMER_MAX), and peptides that are not found
+        self.peps = ['', 'A', 'CD', 'ACD', 'ACDE', 'AAAA', 'WWWWWWWWWWWWWWWW', 'ZZ']
+        for s in seqs:
+            i = random.randrange(len(s))
+            self.peps.append(s[i:i+random.randint(1, 25)])
+
+    def test_find(self):
+        '''
+        The occurrences are the same as str.find
+        '''
+        hits = locator.locate_peptides(self.seqs, self.peps)
+        for p in set(self.peps):
+            self.assertEqual(hits[p], find_all(self.seqs, p), msg=p)
+
+    def test_peptide_pos(self):
+        '''
+        The 1-based positions, and the str.find behaviour for the peptides that are not found
+        '''
+        seqs = {'P1': 'MKPEPTIDEKPEPTIDE', 'P2': 'MKR'}
+        hits = locator.locate_peptides(seqs, ['PEPTIDE', 'XYZ'])
+        self.assertEqual(locator.get_peptide_pos(hits, 'PEPTIDE', 'P1'), [(3, 9)])
+        self.assertEqual(locator.get_peptide_pos(hits, 'PEPTIDE', 'P1', all_hits=True), [(3, 9), (11, 17)])
+        self.assertEqual(locator.get_peptide_pos(hits, 'PEPTIDE', 'P2'), [(0, 6)])
+        self.assertEqual(locator.get_peptide_pos(hits, 'XYZ', 'P1'), [(0, 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import os
+import sys
+import unittest
+
+#########################
+# Import local packages #
+#########################
+sys.path.append(f"{os.path.dirname(__file__)}/../libs")
+import molweight
+
+try:
+    from Bio.SeqUtils.ProtParam import ProteinAnalysis
+except ImportError:
+    ProteinAnalysis = None
+
+####################
+# Global variables #
+####################
+
+SEQS = [
+    'MKWVTFISLLLLFSSAYSRGVFRRDTHKSEIAHRFKDLGEEHFKGLVLIAFSQYLQQCPFDEHVKLVNELTEFAKTCVADESHAGCEKSLHTLFGDELCKVASLRETYGDMADCCEKQEPERNECFLSHKDDSPDLPKLKPDPNTLCDEFKADEKKFWGKYLYEIARRHPYFYAPELLYYANKYNGVFQECCQAEDKGACLLPKIETMREKVLASSARQRLRCASIQKFGERALKAWSVARLSQKFPKAEFVEVTKLVTDLTKVHKECCHGDLLECADDRADLAKYICDNQDTISSKLKECCDKPLLEKSHCIAEVEKDAIPENLPPLTADFAEDKDVCKNYQEAKDAFLGSFLYEYSRRHPEYAVSVLLRLAKEYEATLEECCAKDDPHACYSTVFDKLKHLVDEPQNLIKQNCDQFEKLGEYGFQNALIVRYTRKVPQVSTPTLVEVSRSLGKVGTRCCTKPESERMPCTEDYLSLILNRLCVLHEKTPVSEKVTKCCTESLVNRRPCFSALTPDETYVPKAFDEKLFTFHADICTLPDTEKQIKKQTALVELLKHKPKATEEQLKTVMENFVAFVDKCCAADDKEACFAVEGPKLVVSTQTALA',
+    'PEPTIDE',
+    'ACDEFGHIKLMNPQRSTVWYUO',
+    'MXAKBZ',
+    'G',
+]
+
+
+##################
+# Test functions #
+##################
+
+@unittest.skipIf(ProteinAnalysis is None, "BioPython is not installed")
+class TestMolecularWeight(unittest.TestCase):
+
+    def test_biopython(self):
+        '''
+        The molecular weights are the same as BioPython's (without the ambiguous letters)
+        '''
+        mws = molweight.calculate_molecular_weights(SEQS)
+        for s,mw in zip(SEQS, mws):
+            s = s.replace('X','').replace('B','').replace('Z','')
+            self.assertAlmostEqual(mw, ProteinAnalysis(s).molecular_weight(), delta=0.01, msg=s)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import os
+import sys
+import gzip
+import random
+import tempfile
+import unittest
+
+#########################
+# Import local packages #
+#########################
+sys.path.append(f"{os.path.dirname(__file__)}/../libs")
+import tabix
+import appris_db
+
+try:
+    import pysam
+except ImportError:
+    pysam = None
+
+####################
+# Global variables #
+####################
+
+# APPRIS-like annotations (gff columns) compressed and indexed by htslib (pysam.tabix_compress/tabix_index with the gff preset)
+HTSLIB_FILE = os.path.join(os.path.dirname(__file__), 'data', 'appris_htslib.tsv.gz')
+
+
+####################
+# Common functions #
+####################
+
+def read_records(lines):
+    '''
+    Name and 0-based half-open interval of the records (gff columns)
+    '''
+    recs = []
+    for l in lines:
+        if l.startswith('#'):
+            continue
+        f = l.split('\t')
+        recs.append((f[0], int(f[3])-1, int(f[4]), l))
+    return recs
+
+def get_regions(recs):
+    '''
+    Regions of the queries (name, 1-based start, end): whole names, random windows, and the records themselves
+    '''
+    rnd = random.Random(1)
+    names = sorted(set([ r[0] for r in recs ]))
+    regions = [ (n, None, None) for n in names ]
+    for _ in range(300):
+        n = rnd.choice(names)
+        b = rnd.randint(1, 4000)
+        regions.append((n, b, b + rnd.randint(0, 500)))
+    regions += [ (n, b+1, e) for n,b,e,_ in rnd.sample(recs, 50) ]
+    return regions
+
+def get_region_str(reg):
+    return reg[0] if reg[1] is None else f"{reg[0]}:{reg[1]}-{reg[2]}"
+
+def brute_force(recs, reg):
+    '''
+    Records overlapping the region, in the order of the file
+    '''
+    name, beg, end = reg
+    beg, end = (0, tabix.MAX_POS) if beg is None else (beg-1, end)
+    return [ l for n,b,e,l in recs if n == name and b < end and e > beg ]
+
+
+##################
+# Test functions #
+##################
+
+class TestTabix(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        with gzip.open(HTSLIB_FILE, 'rt') as f:
+            self.text = f.read()
+        self.lines = self.text.rstrip('\n').split('\n')
+        self.recs = read_records(self.lines)
+        self.regions = get_regions(self.recs)
+        # the plain database (unsorted, as the APPRIS files)
+        self.db = os.path.join(self.tmpdir.name, 'appris.tsv')
+        body = self.lines[1:]
+        random.Random(2).shuffle(body)
+        with open(self.db, 'w') as f:
+            f.write('\n'.join([self.lines[0]]+body)+'\n')
+        # the records of the database are sorted by name and start (the ties keep the order of the file)
+        self.db_recs = sorted(read_records(body), key=lambda r: (r[0], r[1]))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def check_queries(self, reader, recs):
+        for reg in self.regions:
+            self.assertEqual(tabix.query(reader, get_region_str(reg)), brute_force(recs, reg), msg=reg)
+
+    def test_htslib(self):
+        '''
+        Read the bgzip file and the tabix index produced by htslib
+        '''
+        reader = tabix.open_tabix(HTSLIB_FILE)
+        try:
+            # the records span several BGZF blocks
+            self.assertGreater(len(list(tabix.iter_blocks(reader))), 2)
+            self.assertEqual(b''.join(tabix.iter_blocks(reader)).decode('utf-8'), self.text)
+            self.check_queries(reader, self.recs)
+        finally:
+            tabix.close_tabix(reader)
+
+    def test_write(self):
+        '''
+        Build the bgzip file and the tabix index from the unsorted database
+        '''
+        files = appris_db.build_tabix(self.db, n_threads=2)
+        reader = tabix.open_tabix(files['bgzip'], files['tbi'])
+        try:
+            self.check_queries(reader, self.db_recs)
+        finally:
+            tabix.close_tabix(reader)
+
+    @unittest.skipIf(pysam is None, "pysam is not installed")
+    def test_write_htslib(self):
+        '''
+        The bgzip file and the tabix index are read by htslib with the same results
+        '''
+        files = appris_db.build_tabix(self.db)
+        with pysam.TabixFile(files['bgzip'], index=files['tbi']) as tbx:
+            for reg in self.regions:
+                self.assertEqual(list(tbx.fetch(get_region_str(reg))), brute_force(self.db_recs, reg), msg=reg)
+
+    def test_sweep(self):
+        '''
+        The single pass over the bgzip file gives the same records as the queries (also with whole-protein regions)
+        '''
+        reader = tabix.open_tabix(HTSLIB_FILE)
+        try:
+            regions = [ get_region_str(reg) for reg in self.regions ] + ['sp:Q00001:10-20', 'P00001:20-10', 'P99999:1-10']
+            hits = tabix.sweep(reader, regions)
+            self.assertEqual(list(hits.keys()), regions)
+            for r in regions:
+                self.assertEqual(hits[r], tabix.query(reader, r), msg=r)
+        finally:
+            tabix.close_tabix(reader)
+
+    def test_regions(self):
+        '''
+        Names with ':' and invalid regions
+        '''
+        reader = tabix.open_tabix(HTSLIB_FILE)
+        try:
+            whole = brute_force(self.recs, ('sp:Q00001', None, None))
+            self.assertEqual(len(whole), 1)
+            self.assertEqual(tabix.query(reader, 'sp:Q00001'), whole)
+            self.assertEqual(tabix.query(reader, 'sp:Q00001:10-20'), whole)
+            self.assertEqual(tabix.query(reader, 'sp:Q00001:60-70'), [])
+            self.assertEqual(tabix.query(reader, 'P00001:5'), brute_force(self.recs, ('P00001', 5, tabix.MAX_POS)))
+            self.assertEqual(tabix.query(reader, 'P00001:20-10'), [])
+            self.assertEqual(tabix.query(reader, 'P99999:1-10'), [])
+        finally:
+            tabix.close_tabix(reader)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+@author: jmrodriguezc
+"""
+
+# import global modules
+import os
+import sys
+import unittest
+import pandas as pd
+
+#########################
+# Import local packages #
+#########################
+sys.path.append(f"{os.path.dirname(__file__)}/../libs")
+import table_filter
+
+
+####################
+# Common functions #
+####################
+
+def get_table():
+    # values as text (as the shared reader), with missing values
+    return pd.DataFrame({
+        'FDR': ['0.01', '0.2', None, '0.04'],
+        'n': ['10', '5', '200', '20'],
+        'tags': ['out', 'in', 'out', 'x'],
+        'idsup': ['AAFTECCQAAD[160.01746]K', 'B', 'C', 'D'],
+        'a': ['1', '5', 'x', '2'],
+        'b': ['2', '3', '3', '1'],
+        'c': ['10', '9', '100', '3']
+    })
+
+def apply_filter(flt, df, numeric_cols=None):
+    return table_filter.apply_filter(table_filter.compile_filter(flt), df, numeric_cols).tolist()
+
+
+##################
+# Test functions #
+##################
+
+class TestTableFilter(unittest.TestCase):
+
+    def test_compare(self):
+        '''
+        Comparisons with numbers (as numbers) and with text (as text). The missing values are only different
+        '''
+        df = get_table()
+        self.assertEqual(apply_filter("([FDR] < 0.05) & ([n] >= 10)", df), [True, False, False, True])
+        self.assertEqual(apply_filter("[FDR] != 0.01", df), [False, True, True, True])
+        self.assertEqual(apply_filter("[FDR] == 0.01", df), [True, False, False, False])
+        self.assertEqual(apply_filter("[n] > '100'", df), [False, True, True, True])
+        self.assertEqual(apply_filter("True", df), [True]*4)
+        self.assertEqual(apply_filter("1 < 2", df), [True]*4)
+
+    def test_quoted_brackets(self):
+        '''
+        The brackets within a quoted text are not columns
+        '''
+        df = get_table()
+        self.assertEqual(apply_filter("[idsup] == 'AAFTECCQAAD[160.01746]K'", df), [True, False, False, False])
+        self.assertEqual(apply_filter('[idsup] == "AAFTECCQAAD[160.01746]K"', df), [True, False, False, False])
+        self.assertEqual(apply_filter(r"[tags] == 'o\'ut'", df), [False]*4)
+        self.assertEqual(table_filter.compile_filter("[idsup] == 'A[x]'")['columns'], ['idsup'])
+
+    def test_not(self):
+        df = get_table()
+        self.assertEqual(apply_filter("~([tags] == 'out')", df), [False, True, False, True])
+        self.assertEqual(apply_filter("not [tags] == 'out'", df), [False, True, False, True])
+        self.assertEqual(apply_filter("~~([tags] == 'out')", df), [True, False, True, False])
+        self.assertEqual(apply_filter("not ([tags] == 'out' or [tags] == 'in')", df), [False, False, False, True])
+
+    def test_precedence(self):
+        '''
+        'and' binds tighter than 'or' (as '&' and '|'), and the parentheses group
+        '''
+        df = get_table()
+        self.assertEqual(apply_filter("[tags] == 'out' or [tags] == 'in' and [n] > 100", df), [True, False, True, False])
+        self.assertEqual(apply_filter("[tags] == 'out' | [tags] == 'in' & [n] > 100", df), [True, False, True, False])
+        self.assertEqual(apply_filter("([tags] == 'out' or [tags] == 'in') and [n] > 100", df), [False, False, True, False])
+        self.assertEqual(apply_filter("[n] > 100 and [tags] == 'out' or [tags] == 'x'", df), [False, False, True, True])
+
+    def test_columns(self):
+        '''
+        Comparisons between columns: as numbers if both columns are numeric, otherwise as text
+        '''
+        df = get_table()
+        self.assertEqual(apply_filter("[b] < [c]", df), [True, True, True, True])
+        # 'a' has text in this chunk, so the columns are compared as text
+        self.assertEqual(apply_filter("[b] < [a]", df), [False, True, True, True])
+        # the types of the whole table are used if they are given, so every chunk gets the same result
+        chunk = df.iloc[[0, 1, 3]]
+        self.assertEqual(apply_filter("[b] < [c]", chunk, {'b': True, 'c': False}), [False, True, True])
+        self.assertEqual(apply_filter("[b] < [c]", chunk, {'b': True, 'c': True}), [True, True, True])
+        flt = table_filter.compile_filter("([a] < [b]) & ([n] > 1)")
+        self.assertEqual(sorted(flt['columns']), ['a', 'b', 'n'])
+        self.assertEqual(sorted(flt['pair_columns']), ['a', 'b'])
+
+    def test_parse_col(self):
+        '''
+        The columns are converted into their labels (tuples with two headers)
+        '''
+        df = pd.DataFrame({('FDR','REL'): ['0.01', '0.2'], ('q','LEVEL'): ['P1', 'P2']})
+        flt = table_filter.compile_filter("[('FDR','REL')] < 0.05", eval)
+        self.assertEqual(flt['columns'], [('FDR','REL')])
+        self.assertEqual(table_filter.apply_filter(flt, df).tolist(), [True, False])
+
+    def test_errors(self):
+        '''
+        The malformed filters raise a ValueError with the filter in the message
+        '''
+        for flt in ["[n] >", "([n] > 1", "[n] > 1)", "[n] = 1", "foo", "[n] > 1 &", "'x'", "[n] > 1 [a]", "[n] > 1 and", "()"]:
+            with self.assertRaises(ValueError, msg=flt) as cm:
+                table_filter.compile_filter(flt)
+            self.assertIn(flt, str(cm.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()